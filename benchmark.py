@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+""" Reproducible benchmarks for the exp_py3 code paths, run against a synthetic marc file.
+    Needs the same PYMARC_EXP__ env-vars as exp_py3.py (for logging-setup); input & output paths are passed explicitly.
+    Usage: `python ./benchmark.py --records 200000 --output ./bench.json`
+    The pymarc-based paths (count_pymarc, extract) can't get past a truncated record, so they run against a clean copy generated
+      from the same seed without truncations; the raw paths get the file with truncated records.
+    """
+
+import argparse, concurrent.futures, datetime, importlib.metadata, json, logging, os, platform, random, resource, sys, tempfile, time
+
+
+PROJECT_DIR = os.path.dirname( os.path.abspath(__file__) )
+sys.path.append( os.path.dirname(PROJECT_DIR) )
+from pymarc_experimentation import exp_py3, settings
+
+
+log = logging.getLogger( 'pymarc_experimentation' )
+
+WORDS = [ 'library', 'catalog', 'history', 'of', 'the', 'annual', 'report', 'Brown', 'university', 'studies',
+          'café', 'naïve', 'Müller', 'São Paulo', 'Ελληνικά', '日本語' ]
+
+
+###############
+## generator ##
+###############
+
+
+def build_raw_record( fields, utf8=True ):
+    """ Serializes `[ (tag, data_bytes), ... ]` into a transmission-format record; data-fields must already carry indicators & subfields.
+        Called by generate_synthetic_marc() """
+    directory = b''; body = b''
+    for ( tag, data ) in fields:
+        data += exp_py3.FIELD_TERMINATOR
+        directory += tag + b'%04d%05d' % ( len(data), len(body) )
+        body += data
+    directory += exp_py3.FIELD_TERMINATOR
+    body += exp_py3.RECORD_TERMINATOR
+    base_address = exp_py3.LEADER_LEN + len( directory )
+    leader = b'%05dnam %s22%05d   4500' % ( base_address+len(body), b'a' if utf8 else b' ', base_address )
+    return leader + directory + body
+
+
+def build_data_field( indicators, subfields ):
+    """ Returns data-field bytes from indicators & `[ (code, value), ... ]`.
+        Called by generate_synthetic_marc() """
+    return indicators.encode( 'ascii' ) + b''.join( [exp_py3.SUBFIELD_DELIMITER + code.encode('ascii') + val.encode('utf-8') for (code, val) in subfields] )
+
+
+def generate_synthetic_marc( filepath, record_count, seed=0, max_items=12, invalid_utf8_rate=0.01, truncated_rate=0.001 ):
+    """ Writes record_count synthetic records shaped like a Sierra export: varying record sizes, a 907 bib_id, repeated 945 item fields,
+          some invalid utf-8 bytes, and some truncated records.
+        The same seed always produces the same file, and the same records whatever truncated_rate is -- only the truncations differ. Returns a dict of what was generated. """
+    rng = random.Random( seed )
+    stats = { 'records': record_count, 'invalid_utf8': 0, 'truncated': 0, 'items': 0 }
+    with open( filepath, 'wb' ) as fh:
+        for number in range( record_count ):
+            title = ' '.join( rng.choice(WORDS) for _ in range(rng.randint(2, 12)) )
+            fields = [
+                (b'001', 'ocm{:09d}'.format(number).encode('ascii')),
+                (b'008', b'160101s2016    riu           000 0 eng d'),
+                (b'245', build_data_field('10', [('a', title), ('b', rng.choice(WORDS)), ('c', 'by ' + rng.choice(WORDS))])) ]
+            for _ in range( rng.randint(0, 6) ):  # notes make record sizes vary
+                fields.append( (b'500', build_data_field('  ', [('a', ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 60))))])) )
+            fields.append( (b'907', build_data_field('  ', [('a', '.b{:07d}{}'.format(number, rng.choice('0123456789x'))), ('b', '01-01-16')])) )
+            for item_number in range( rng.randint(0, max_items) ):
+                fields.append( (b'945', build_data_field('  ', [('l', 'loc{}'.format(rng.randint(0, 20))), ('y', '.i{:07d}{:02d}'.format(number, item_number))])) )
+                stats['items'] += 1
+            raw = build_raw_record( fields )
+            if rng.random() < invalid_utf8_rate:
+                position = raw.index( exp_py3.SUBFIELD_DELIMITER + b'a', raw.index(b'\x1e') ) + 2
+                raw = raw[:position] + b'\xff\xfe' + raw[position+2:]  # same length, so the directory stays valid
+                stats['invalid_utf8'] += 1
+            cut = rng.randint( exp_py3.LEADER_LEN, len(raw)-1 )  # drawn even when unused, so a truncated_rate=0 copy stays in step with the same seed
+            if rng.random() < truncated_rate:
+                raw = raw[:cut]
+                stats['truncated'] += 1
+            fh.write( raw )
+    stats['bytes'] = os.path.getsize( filepath )
+    log.debug( 'generated, ```{}```'.format(stats) )
+    return stats
+
+
+################
+## benchmarks ##
+################
+
+
+def bench_count_pymarc( marc_filepath, work_dir ):
+    """ count_records(), the MARCReader baseline. """
+    settings.INPUT_FILEPATH = marc_filepath
+    exp_py3.count_records()
+
+
+def bench_count_fast( marc_filepath, work_dir ):
+    """ count_records_fast(), leader-lengths only. """
+    exp_py3.count_records_fast( marc_filepath )
+
+
+def bench_extract( marc_filepath, work_dir ):
+    """ Extractor.extract_info(), writing rows to a jsonl sink rather than the log. """
+    settings.SINK_FILEPATH = os.path.join( work_dir, 'extract.jsonl' )
+    exp_py3.Extractor( marc_filepath ).extract_info()
+
+
+def bench_extract_lazy( marc_filepath, work_dir ):
+    """ Extractor.extract_info_lazy(), writing rows to a jsonl sink. """
+    settings.SINK_FILEPATH = os.path.join( work_dir, 'extract_lazy.jsonl' )
+    exp_py3.Extractor( marc_filepath ).extract_info_lazy()
+
+
+def bench_split( marc_filepath, work_dir ):
+    """ split_records() by count. """
+    exp_py3.split_records( os.path.join(work_dir, 'split'), records_per_file=50000, marc_filepath=marc_filepath )
+
+
+def bench_validate( marc_filepath, work_dir ):
+    """ validate_records(), including the strict utf-8 check. """
+    exp_py3.validate_records( marc_filepath, os.path.join(work_dir, 'quarantine.mrc'), os.path.join(work_dir, 'validation.json') )
+
+
+BENCHMARKS = {
+    'count_pymarc': bench_count_pymarc,
+    'count_fast': bench_count_fast,
+    'extract': bench_extract,
+    'extract_lazy': bench_extract_lazy,
+    'split': bench_split,
+    'validate': bench_validate }
+CLEAN_INPUT_BENCHMARKS = ( 'count_pymarc', 'extract' )  # MARCReader-based; a truncated record stops them
+
+
+def run_benchmark( name, marc_filepath, work_dir ):
+    """ Runs one benchmark & returns (seconds, peak-rss-kb).
+        Runs in a fresh worker process, so peak rss belongs to this benchmark alone.
+        Called by run_suite() """
+    log.setLevel( logging.WARNING )  # per-record debug logging would swamp the measurement
+    start = time.perf_counter()
+    BENCHMARKS[name]( marc_filepath, work_dir )
+    seconds = time.perf_counter() - start
+    return ( seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss )
+
+
+def run_suite( record_count, names, seed=0, work_dir=None, invalid_utf8_rate=0.01, truncated_rate=0.001 ):
+    """ Generates the synthetic file, runs each named benchmark, and returns machine-readable results. """
+    work_dir = work_dir or tempfile.mkdtemp( prefix='pymarc_bench_' )
+    os.makedirs( work_dir, exist_ok=True )
+    marc_filepath = os.path.join( work_dir, 'synthetic_{}_{}.mrc'.format(record_count, seed) )
+    generated = generate_synthetic_marc( marc_filepath, record_count, seed, invalid_utf8_rate=invalid_utf8_rate, truncated_rate=truncated_rate )
+    ( clean_filepath, clean_generated ) = ( marc_filepath, generated )
+    if generated['truncated'] and any( name in CLEAN_INPUT_BENCHMARKS for name in names ):
+        clean_filepath = os.path.join( work_dir, 'synthetic_{}_{}_clean.mrc'.format(record_count, seed) )
+        clean_generated = generate_synthetic_marc( clean_filepath, record_count, seed, invalid_utf8_rate=invalid_utf8_rate, truncated_rate=0 )
+    results = []
+    for name in names:
+        ( input_filepath, input_generated ) = ( clean_filepath, clean_generated ) if name in CLEAN_INPUT_BENCHMARKS else ( marc_filepath, generated )
+        with concurrent.futures.ProcessPoolExecutor( max_workers=1 ) as executor:
+            try:
+                ( seconds, peak_rss_kb ) = executor.submit( run_benchmark, name, input_filepath, work_dir ).result()
+            except Exception as e:
+                results.append( {'name': name, 'error': repr(e)} )
+                print( '`{name}` -- failed, ```{err}```'.format( name=name, err=repr(e) ) )
+                continue
+        results.append( {
+            'name': name, 'input': os.path.basename( input_filepath ), 'seconds': round( seconds, 4 ),
+            'records_per_sec': round( record_count / seconds, 1 ),
+            'mb_per_sec': round( input_generated['bytes'] / 1048576.0 / seconds, 2 ),
+            'peak_rss_kb': peak_rss_kb } )
+        print( '`{name}` -- `{rps}` records/sec'.format( name=name, rps=results[-1]['records_per_sec'] ) )
+    return {
+        'timestamp': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(), 'pymarc': importlib.metadata.version( 'pymarc' ),
+        'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+        'generated': dict( generated, seed=seed ),
+        'generated_clean': dict( clean_generated, seed=seed ) if clean_filepath != marc_filepath else None,
+        'results': results }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser( description='benchmark exp_py3 code paths against a synthetic marc file' )
+    parser.add_argument( '--records', type=int, default=100000 )
+    parser.add_argument( '--seed', type=int, default=0 )
+    parser.add_argument( '--invalid-utf8-rate', type=float, default=0.01 )
+    parser.add_argument( '--truncated-rate', type=float, default=0.001 )
+    parser.add_argument( '--only', nargs='*', choices=sorted(BENCHMARKS), default=list(BENCHMARKS) )
+    parser.add_argument( '--work-dir', default=None, help='defaults to a new temp directory' )
+    parser.add_argument( '--output', default=None, help='json results file; defaults to stdout' )
+    args = parser.parse_args()
+    report = run_suite( args.records, args.only, args.seed, args.work_dir, args.invalid_utf8_rate, args.truncated_rate )
+    if args.output:
+        with open( args.output, 'w' ) as fh:
+            json.dump( report, fh, indent=2 )
+    else:
+        print( json.dumps(report, indent=2) )
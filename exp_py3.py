@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
-import datetime, json, logging, logging.config, os, pprint, sys
+import argparse, array, asyncio, bz2, codecs, collections, concurrent.futures, contextlib, csv, datetime, glob, gzip, hashlib, json, logging, logging.config, io, lzma, mmap, os, pprint, re, sqlite3, struct, sys, tempfile, time, zlib
+import xml.etree.ElementTree as ElementTree
 import pymarc
 
 
@@ -19,12 +20,22 @@ log.debug( 'logging ready' )
 logging.getLogger('pymarc').setLevel( logging.WARNING )
 logging.getLogger('TerminalIPythonApp').setLevel( logging.WARNING )
 
+LEADER_LEN = 24
+MAX_RECORD_LEN = 99999  # the leader's record-length is 5 digits
+DIRECTORY_ENTRY_LEN = 12
+FIELD_TERMINATOR = b'\x1e'
+RECORD_TERMINATOR = b'\x1d'
+SUBFIELD_DELIMITER = b'\x1f'
+LEADER_PATTERN = re.compile( rb'[0-9]{5}[^\x1d\x1e\x1f]{7}[0-9]{5}[^\x1d\x1e\x1f]{7}' )  # record-length & base-address digits, no delimiters
+DIRECTORY_ENTRY_PATTERN = re.compile( rb'.{3}([0-9]{9})', re.DOTALL )  # any tag, then the length & offset digits
+UNREADABLE_RECORD_ERRORS = ( ValueError, pymarc.exceptions.PymarcException )  # what a broken leader or directory raises, from int() or pymarc
+
 
 class Extractor( object ):
     """ Manages extraction of info from records in a marc file. """
 
-    def __init__( self ):
-        self.marc_filepath = settings.INPUT_FILEPATH
+    def __init__( self, marc_filepath=None, filter_spec=None ):
+        self.marc_filepath = marc_filepath or settings.INPUT_FILEPATH
         log.debug( 'processing file, ``{}```'.format(self.marc_filepath) )
         self.count = 0
         self.title = 'init'
@@ -32,22 +43,404 @@ class Extractor( object ):
         self.item_id = 'init'
         self.record_dct = 'init'
         self.record_dct_logged = False
+        self.sink = None
+        self.sink_filepath = None  # overrides settings.SINK_FILEPATH, e.g. one sink per file in batch mode
+        self.sink_format = None  # overrides settings.SINK_FORMAT
+        self.checkpoint_filepath = settings.CHECKPOINT_FILEPATH or '{}.checkpoint.json'.format( self.marc_filepath )
+        self.timer = StageTimer()
+        self.progress = None
+        self.decoder = RecordDecoder() if settings.DECODE_MODE == 'fallback' else None
+        self.row = None
+        filter_spec = filter_spec or settings.RECORD_FILTER
+        self.record_filter = RecordFilter( filter_spec ) if filter_spec else None
+        self.filtered_out = 0
+        self.error_counts = {}  # records skipped on the raw-record paths, by validate_records() error-type
+        self.cache_status = None
+        self._detected = None
 
-    def extract_info( self ):
+    def extract_info( self, resume=False ):
         """ Prints/logs certain record elements.
             The ```utf8_handling='ignore'``` is required to avoid a unicode-error.
+            With resume=True, carries on from the last checkpoint instead of byte zero.
+            MARCXML & MARC-in-JSON input is streamed too, but can't checkpoint -- its read-position isn't record-aligned; the lazy path can.
             """
         start = datetime.datetime.now()
-        with open( self.marc_filepath, 'rb' ) as fh:
-            reader = pymarc.MARCReader( fh, force_utf8=True, utf8_handling='ignore' )  # w/o 'ignore', this line generates a unicode-error
-            for record in reader:
-                self.setup_main_loop( record )  # updates instance vars
-                for field_dct in self.record_dct['fields']:
-                    self.find_bib_and_item( field_dct )
+        input_format = self.detected[1]
+        if resume and input_format != 'marc':
+            raise ValueError( '{} input can only resume on the lazy path'.format(input_format) )
+        state = self.load_checkpoint() if resume else None
+        with open_marc_input( self.marc_filepath, self.detected ) as fh, self.sink_session( state ):
+            fh.seek( self.resume_from(state) )
+            self.start_progress( fh.tell() )
+            for record in self.iter_decoded_records( fh, input_format ):
+                self.extract_record( record )  # updates instance vars
                 self.log_basic_info()
-                self.update_count()
+                self.update_count( fh.tell() )
+                if input_format == 'marc':
+                    self.checkpoint_if_due( fh.tell() )
+                self.timer.lap( 'bookkeeping' )
                 # if count > 3: break
+        self.clear_checkpoint()
+        log.info( 'count of records in file, `{count}`; time_taken, `{time}`'.format( count=self.count, time=datetime.datetime.now()-start ) )
+        self.log_stage_summary()
+
+    def extract_info_parallel( self, workers=None, lazy=False ):
+        """ Parallel version of extract_info().
+            Shards the file on record boundaries (at most settings.PARALLEL_SHARD_MB each), runs the bib/item extraction in a process pool,
+              then logs the results in original record order, so output & totals match the serial path.
+            Only PARALLEL_SHARDS_IN_FLIGHT shards per worker are submitted at a time, so finished shards' rows can't pile up in this process
+              while it waits on an earlier one. """
+        if not can_memory_map( self.marc_filepath, self.detected ):
+            log.warning( 'compressed, MARCXML & MARC-in-JSON input can not be sharded; running serially' )
+            return self.extract_info_lazy() if lazy else self.extract_info()
+        start = datetime.datetime.now()
+        workers = workers or os.cpu_count()
+        shard_count = max( workers * 4, -(-os.path.getsize(self.marc_filepath) // (settings.PARALLEL_SHARD_MB*1024*1024)) )  # extra shards even out uneven record sizes
+        shards = find_shard_boundaries( self.marc_filepath, shard_count )
+        log.debug( 'workers, `{wrk}`; shards, `{shd}`'.format( wrk=workers, shd=len(shards) ) )
+        with concurrent.futures.ProcessPoolExecutor( max_workers=workers ) as executor, self.sink_session():
+            self.start_progress( 0 )
+            pending = collections.deque()
+            for ( shard_start, shard_end ) in shards:
+                pending.append( (shard_end, executor.submit(extract_shard, self.marc_filepath, shard_start, shard_end, lazy, self.filter_spec)) )
+                if len( pending ) >= workers * settings.PARALLEL_SHARDS_IN_FLIGHT:
+                    self.write_shard( *pending.popleft() )
+            while pending:
+                self.write_shard( *pending.popleft() )
+        log.info( 'count of records in file, `{count}`; time_taken, `{time}`'.format( count=self.count, time=datetime.datetime.now()-start ) )
+        self.log_stage_summary()
+
+    def write_shard( self, shard_end, future ):
+        """ Waits for one shard's rows & logs/sinks them.
+            Called by extract_info_parallel() """
+        ( rows, stats ) = future.result()
+        self.timer.lap( 'worker_wait' )  # raw read, decode & extraction all happen in the workers
+        self.merge_worker_stats( stats )
+        for ( self.title, self.bib_id, self.item_id ) in rows:
+            self.log_basic_info()
+            self.update_count( shard_end )  # the whole shard has been read by the time its rows arrive
+            self.timer.lap( 'bookkeeping' )
+        return
+
+    def extract_info_lazy( self, resume=False ):
+        """ Like extract_info(), but walks RecordViews over a memory-mapped (or decompressed) file and decodes only the 245/907/945 values,
+              skipping the full pymarc parse and as_dict() copy of every record -- and, on a memory-map, even the copy of its raw bytes. """
+        start = datetime.datetime.now()
+        state = self.load_checkpoint() if resume else None
+        with self.sink_session( state ):
+            start_offset = self.resume_from( state )
+            self.start_progress( start_offset )
+            for ( offset, length, ok, view ) in iter_record_views( self.marc_filepath, start=start_offset, detected=self.detected ):
+                if not ok:
+                    self.skip_record( offset, 'bad_record_length' )
+                    continue
+                self.timer.lap( 'raw_read' )
+                try:
+                    if self.record_filter and not self.passes_filter( view ):
+                        continue
+                    self.extract_record_view( view )
+                except UNREADABLE_RECORD_ERRORS:
+                    if not self.skip_unreadable( offset, view.raw() ):
+                        raise
+                    continue
+                self.timer.lap( 'decode_and_extraction' )  # one directory-driven step on this path
+                self.log_basic_info()
+                self.update_count( offset+length )
+                self.checkpoint_if_due( offset+length )
+                self.timer.lap( 'bookkeeping' )
+        self.clear_checkpoint()
+        log.info( 'count of records in file, `{count}`; time_taken, `{time}`'.format( count=self.count, time=datetime.datetime.now()-start ) )
+        self.log_stage_summary()
+
+    def extract_info_selected( self, spec=None, resume=False ):
+        """ Like extract_info_lazy(), but the columns come from a FieldSelectors spec (default settings.EXTRACT_SELECTORS)
+              instead of the hardcoded title/bib_id/item_id, so a new report needs a new spec rather than another extraction loop. """
+        start = datetime.datetime.now()
+        selectors = FieldSelectors( spec )
+        state = self.load_checkpoint() if resume else None
+        with self.sink_session( state, fieldnames=selectors.names ):
+            start_offset = self.resume_from( state )
+            self.start_progress( start_offset )
+            for ( offset, length, ok, raw ) in iter_raw_input( self.marc_filepath, start=start_offset, detected=self.detected ):
+                if not ok:
+                    self.skip_record( offset, 'bad_record_length' )
+                    continue
+                self.timer.lap( 'raw_read' )
+                try:
+                    if self.record_filter and not self.passes_filter( RecordView(raw) ):
+                        continue
+                    self.row = selectors.extract( raw, self.decoder.value_decoder(raw, count_record=True) if self.decoder else None )
+                except UNREADABLE_RECORD_ERRORS:
+                    if not self.skip_unreadable( offset, raw ):
+                        raise
+                    continue
+                self.timer.lap( 'decode_and_extraction' )
+                self.log_basic_info( self.row )
+                self.update_count( offset+length )
+                self.checkpoint_if_due( offset+length )
+                self.timer.lap( 'bookkeeping' )
+        self.clear_checkpoint()
+        log.info( 'count of records in file, `{count}`; time_taken, `{time}`'.format( count=self.count, time=datetime.datetime.now()-start ) )
+        self.log_stage_summary()
+
+    def extract_info_cached( self ):
+        """ Serves extract_info_lazy()'s rows from the ExtractCache: an unchanged file costs no parsing at all, and a file that only grew
+              costs just its new tail. Input the cache can't key by byte position (compressed or structured), or a run with a record-filter
+              (which needs raw bytes), goes straight to extract_info_lazy(). """
+        if self.record_filter or not can_memory_map( self.marc_filepath, self.detected ):
+            log.warning( 'extraction cache skipped for this input; running the lazy path' )
+            return self.extract_info_lazy()
+        start = datetime.datetime.now()
+        with self.sink_session():
+            self.start_progress( 0 )
+            ( extract, self.cache_status ) = ExtractCache().open( self.marc_filepath, self.extract_range )
+            self.timer.lap( 'cache_{}'.format(self.cache_status) )
+            try:
+                for row in extract:
+                    self.timer.lap( 'cache_read' )
+                    self.log_basic_info( row )
+                    self.update_count()
+                    self.timer.lap( 'bookkeeping' )
+            finally:
+                extract.close()
+        log.info( 'count of records in file, `{count}`; cache, `{st}`; time_taken, `{time}`'.format( count=self.count, st=self.cache_status, time=datetime.datetime.now()-start ) )
+        self.log_stage_summary()
+
+    def extract_range( self, start_offset, sink ):
+        """ Writes extract_record_view() rows for the records from start_offset to sink; returns the end of the last good record.
+            Called by ExtractCache.open() """
+        covered = start_offset
+        for ( offset, length, ok, view ) in iter_record_views( self.marc_filepath, start=start_offset, detected=self.detected ):
+            if not ok:
+                self.skip_record( offset, 'bad_record_length' )
+                continue
+            try:
+                ( title, bib_id, item_id ) = self.extract_record_view( view )
+            except UNREADABLE_RECORD_ERRORS:
+                if not self.skip_unreadable( offset, view.raw() ):
+                    raise
+                continue
+            sink.write( {'title': title, 'bib_id': bib_id, 'item_id': item_id} )
+            covered = offset + length
+        return covered
+
+    def extract_info_async( self, workers=None, lazy=True ):
+        """ asyncio pipeline version of extract_info(): a reader, a parse/extract stage and a writer, joined by bounded queues.
+            Reading & writing run in threads and parse/extract in a process pool, so a slow sink or log no longer stalls reading,
+              while the bounded queues apply backpressure and keep memory flat. Rows come out in original record order. """
+        start = datetime.datetime.now()
+        asyncio.run( self.run_pipeline(workers or os.cpu_count(), lazy) )
         log.info( 'count of records in file, `{count}`; time_taken, `{time}`'.format( count=self.count, time=datetime.datetime.now()-start ) )
+        self.log_stage_summary()
+
+    async def run_pipeline( self, workers, lazy ):
+        """ Wires up the three stages.
+            Called by extract_info_async() """
+        raw_queue = asyncio.Queue( maxsize=settings.PIPELINE_QUEUE_SIZE )
+        row_queue = asyncio.Queue( maxsize=settings.PIPELINE_QUEUE_SIZE )
+        with concurrent.futures.ProcessPoolExecutor( max_workers=workers ) as cpu_pool, \
+                concurrent.futures.ThreadPoolExecutor( max_workers=2 ) as io_pool, self.sink_session():
+            self.start_progress( 0 )
+            await asyncio.gather(
+                self.read_stage( raw_queue, io_pool ),
+                self.parse_stage( raw_queue, row_queue, cpu_pool, lazy ),
+                self.write_stage( row_queue, io_pool ) )
+
+    async def read_stage( self, raw_queue, io_pool ):
+        """ Reads batches of raw records in a thread & queues them; None marks the end.
+            Called by run_pipeline() """
+        loop = asyncio.get_running_loop()
+        raw_records = iter_raw_input( self.marc_filepath, detected=self.detected )
+        while True:
+            batch = await loop.run_in_executor( io_pool, read_raw_batch, raw_records, settings.PIPELINE_BATCH_SIZE, self.skip_record )
+            if batch is None:
+                break
+            await raw_queue.put( batch )  # waits while the queue is full
+        await raw_queue.put( None )
+
+    async def parse_stage( self, raw_queue, row_queue, cpu_pool, lazy ):
+        """ Hands each batch to the process pool and queues the pending result, so several batches parse at once but stay in order.
+            Called by run_pipeline() """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await raw_queue.get()
+            if batch is None:
+                break
+            ( raws, offsets, end_offset ) = batch
+            await row_queue.put( (loop.run_in_executor(cpu_pool, extract_raw_batch, self.marc_filepath, raws, offsets, lazy, self.filter_spec), end_offset) )
+        await row_queue.put( None )
+
+    async def write_stage( self, row_queue, io_pool ):
+        """ Awaits each batch's rows in order & writes them (sink or log) in a thread.
+            Called by run_pipeline() """
+        loop = asyncio.get_running_loop()
+        while True:
+            entry = await row_queue.get()
+            if entry is None:
+                break
+            ( pending_rows, end_offset ) = entry
+            ( rows, stats ) = await pending_rows
+            self.merge_worker_stats( stats )
+            await loop.run_in_executor( io_pool, self.write_rows, rows, end_offset )
+
+    def write_rows( self, rows, end_offset ):
+        """ Logs/sinks a batch of (title, bib_id, item_id) rows.
+            Called by write_stage() """
+        self.timer.lap( 'waiting_for_parse' )  # time the writer sat idle; read & parse overlap with it in other threads/processes
+        for ( self.title, self.bib_id, self.item_id ) in rows:
+            self.log_basic_info()
+            self.update_count( end_offset )
+        return
+
+    def extract_raw_record( self, raw ):
+        """ Directory-driven version of extract_record(); decodes only the wanted fields of a raw record.
+            Produces the same title, bib_id & item_id as record.title(), extract_bib() and extract_item().
+            Called by extract_raw_batch() """
+        self.title = None
+        self.bib_id = 'not_available'
+        self.item_id = 'not_available'
+        title_found = False
+        decode_value = self.decoder.value_decoder( raw, count_record=True ) if self.decoder else None
+        for ( tag, data ) in read_directory_fields( raw, (b'245', b'907', b'945') ):
+            subfields = split_subfields( data, decode_value and (lambda value, tag=tag.decode('ascii'): decode_value(value, tag)) )
+            if tag == b'245' and title_found is False:  # record.title() only looks at the first 245
+                title_found = True
+                self.title = next( (val for (code, val) in subfields if code == 'a'), None )
+                if self.title:
+                    subfield_b = next( (val for (code, val) in subfields if code == 'b'), None )
+                    if subfield_b is not None:
+                        self.title += ' ' + subfield_b
+            elif tag == b'907':
+                if subfields and subfields[0][0] == 'a':
+                    self.bib_id = subfields[0][1][0:9]
+                else:
+                    log.debug( 'no leading 907$a for bib_id, ```{}```'.format(data) )
+            elif tag == b'945':
+                for ( code, val ) in subfields:
+                    if code == 'y':
+                        self.item_id = val
+        return ( self.title, self.bib_id, self.item_id )
+
+    def iter_decoded_records( self, fh, input_format ):
+        """ Yields the pymarc.Records that pass the record-filter, timing raw-read & decode apart.
+            Called by extract_info() """
+        if input_format != 'marc':
+            for record in iter_structured_records( fh, input_format ):
+                self.timer.lap( 'parse' )
+                if self.record_filter and not self.passes_filter( RecordView(record.as_marc()) ):
+                    continue
+                yield record
+            return
+        for chunk in iter_raw_records( fh ):  # reads exactly as MARCReader does, so raw-read & decode can be timed apart
+            self.timer.lap( 'raw_read' )
+            try:
+                if self.record_filter and not self.passes_filter( RecordView(chunk) ):
+                    continue
+                record = self.decode_raw( chunk )
+            except UNREADABLE_RECORD_ERRORS:
+                if not self.skip_unreadable( fh.tell()-len(chunk), chunk ):
+                    raise
+                continue
+            self.timer.lap( 'decode' )
+            yield record
+
+    @property
+    def detected( self ):
+        """ The input's `( compression, input_format )`, from detect_input(); sniffed once per Extractor & passed down to the readers. """
+        if self._detected is None:
+            self._detected = detect_input( self.marc_filepath )
+        return self._detected
+
+    @property
+    def filter_spec( self ):
+        return self.record_filter.spec if self.record_filter else None
+
+    def passes_filter( self, view ):
+        """ Tests the record-filter against a record's raw bytes, counting what it drops.
+            Called by the extract_info*() methods """
+        keep = self.record_filter.matches( view )
+        if not keep:
+            self.filtered_out += 1
+        self.timer.lap( 'filter' )
+        return keep
+
+    def skip_record( self, offset, error_type ):
+        """ Logs & counts a record the run skips, by the error-type validate_records() would give it.
+            Called by the extract_info*() methods, skip_unreadable() and the worker functions """
+        self.error_counts[error_type] = self.error_counts.get( error_type, 0 ) + 1
+        log.warning( 'skipping record at offset, `{off}`; error, `{err}`'.format( off=offset, err=error_type ) )
+        return
+
+    def skip_unreadable( self, offset, raw ):
+        """ For an UNREADABLE_RECORD_ERRORS error out of a record's filter, decode or extraction: if check_raw_record() finds the record broken
+              (e.g. a non-digit directory entry), skips it via skip_record() & returns True; False means the error lies elsewhere & should propagate.
+            Called by the extract_info*() methods and the worker functions """
+        error_type = check_raw_record( raw, check_utf8=False )
+        if error_type is None:
+            return False
+        self.skip_record( offset, error_type )
+        return True
+
+    def decode_raw( self, raw ):
+        """ Returns a pymarc.Record for raw record bytes, honoring settings.DECODE_MODE.
+            Called by iter_decoded_records() and the worker functions """
+        if self.decoder:
+            return self.decoder.decode( raw )
+        return pymarc.Record( raw, force_utf8=True, utf8_handling='ignore' )  # w/o 'ignore', this line generates a unicode-error
+
+    def worker_stats( self ):
+        """ Returns the counts a worker's Extractor gathered, for the parent to merge.
+            Called by extract_shard() and extract_raw_batch(), in a worker process """
+        return { 'filtered_out': self.filtered_out, 'error_counts': self.error_counts, 'decode': self.decoder.summary() if self.decoder else None }
+
+    def merge_worker_stats( self, stats ):
+        """ Folds a worker's worker_stats() into this run's filter & decode counts.
+            Called by extract_info_parallel() and write_stage() """
+        self.filtered_out += stats['filtered_out']
+        for ( error_type, cnt ) in stats['error_counts'].items():
+            self.error_counts[error_type] = self.error_counts.get( error_type, 0 ) + cnt
+        if self.decoder and stats['decode']:
+            self.decoder.merge( stats['decode'] )
+        return
+
+    def extract_record_view( self, view ):
+        """ RecordView version of extract_raw_record(); same results, but values are only copied out of the buffer once they're wanted.
+            Called by extract_info_lazy() and extract_shard() """
+        self.title = None
+        self.bib_id = 'not_available'
+        self.item_id = 'not_available'
+        title_found = False
+        item_span = None
+        decode_value = self.decoder.value_decoder( view.leader.tobytes(), count_record=True ) if self.decoder else None
+        for ( tag, start, end ) in view.iter_fields( (b'245', b'907', b'945') ):
+            if tag == b'245' and title_found is False:  # record.title() only looks at the first 245
+                title_found = True
+                self.title = view.first_value( tag, start, end, b'a', decode_value )
+                if self.title:
+                    subfield_b = view.first_value( tag, start, end, b'b', decode_value )
+                    if subfield_b is not None:
+                        self.title += ' ' + subfield_b
+            elif tag == b'907':
+                ( code, value_start, value_end ) = next( view.iter_subfields(start, end), (None, 0, 0) )
+                if code == b'a':
+                    self.bib_id = view.decode( value_start, value_end, tag, decode_value )[0:9]
+                else:
+                    log.debug( 'no leading 907$a for bib_id, ```{}```'.format(view.buf[start:end]) )
+            elif tag == b'945':
+                item_span = view.find_subfield( start, end, b'y', last=True ) or item_span  # the last 945$y wins, so only it gets decoded
+        if item_span:
+            self.item_id = view.decode( item_span[0], item_span[1], b'945', decode_value )
+        return ( self.title, self.bib_id, self.item_id )
+
+    def extract_record( self, record ):
+        """ Runs the bib/item extraction on one record; returns (title, bib_id, item_id).
+            Called by extract_info() and extract_shard() """
+        self.setup_main_loop( record )
+        self.timer.lap( 'field_access' )  # record.title() & as_dict()
+        for field_dct in self.record_dct['fields']:
+            self.find_bib_and_item( field_dct )
+        self.timer.lap( 'extraction' )
+        return ( self.title, self.bib_id, self.item_id )
 
     def setup_main_loop( self, record ):
         """ Initializes main processing loop.
@@ -58,14 +451,14 @@ class Extractor( object ):
         self.item_id = 'not_available'
         self.record_dct_logged = False
         self.record_dct = record.as_dict()
-        log.debug( 'self.record_dct, ```{}```'.format(self.record_dct) )
+        self.log_debug( 'field_access', 'self.record_dct, ```{}```', self.record_dct, pretty=False )
         return
 
     def find_bib_and_item( self, field_dct ):
         """ Extracts bib_id and item_id.
             Called by extract_info() """
         for (k, val_dct) in field_dct.items():
-            log.debug( 'k, `{k}`; val_dct, ```{v}```'.format( k=k, v=pprint.pformat(val_dct) ) )
+            self.log_debug( 'extraction', 'k, `' + k + '`; val_dct, ```{}```', val_dct )
             self.extract_bib( k, val_dct )
             self.extract_item( k, val_dct )
         return
@@ -78,7 +471,7 @@ class Extractor( object ):
                 self.bib_id = val_dct['subfields'][0]['a'][0:9]
             except Exception as e:
                 log.debug( 'exception getting bib_id, ``{}```'.format(e) )
-                log.debug( 'record_dct, ```{}```'.format( pprint.pformat(self.record_dct) ) )
+                self.log_debug( 'extraction', 'record_dct, ```{}```', self.record_dct )
                 self.record_dct_logged = True
         return
 
@@ -95,27 +488,1167 @@ class Extractor( object ):
             except Exception as f:
                 log.debug( 'exception getting item_id, ``{}```'.format(f) )
                 if self.record_dct_logged is False:
-                    log.debug( 'record_dct, ```{}```'.format( pprint.pformat(self.record_dct) ) )
+                    self.log_debug( 'extraction', 'record_dct, ```{}```', self.record_dct )
         return
 
-    def log_basic_info( self ):
-        """ Assembles & logs extracted info.
-            Called by extract_info() """
-        basic_info = { 'title': self.title, 'bib_id': self.bib_id, 'item_id': self.item_id }
-        log.info( 'basic_info, ```{}```'.format( pprint.pformat(basic_info) ) )
+    def log_debug( self, running_stage, template, value, pretty=True ):
+        """ Logs template formatted with value (pformat()ted, if pretty) -- but only when debug-logging is on, since formatting a record's
+              dict costs several times the extraction itself. The formatting is charged to the `logging` stage rather than running_stage.
+            Called by setup_main_loop(), find_bib_and_item(), extract_bib() and extract_item() """
+        if not log.isEnabledFor( logging.DEBUG ):
+            return
+        self.timer.lap( running_stage )
+        log.debug( template.format(pprint.pformat(value) if pretty else value) )
+        self.timer.lap( 'logging' )
+        return
+
+    @contextlib.contextmanager
+    def sink_session( self, state=None, fieldnames=None ):
+        """ Opens the output sink configured in settings (if any) for the length of a run, flushing it on the way out.
+            When resuming from checkpoint-state, the sink is cut back to its checkpointed position so no row is written twice.
+            If the run fails, a sink with an abort() (e.g. SqliteSink) discards its output instead; the others flush what they have.
+            Called by the extract_info*() methods """
+        self.sink = make_sink( self.sink_filepath, self.sink_format, resume_position=state['sink_position'] if state else None, fieldnames=fieldnames )
+        try:
+            yield self.sink
+        except BaseException:
+            if self.sink:
+                if hasattr( self.sink, 'abort' ):
+                    self.sink.abort()
+                else:
+                    self.sink.close()
+            raise
+        if self.sink:
+            self.sink.close()
+
+    def load_checkpoint( self ):
+        """ Returns the saved checkpoint-state, or None if there isn't one, the marc file has changed since it was saved,
+              the run's sink (path or format, or having one at all) differs from the one it was saved with,
+              or that sink file is gone or shorter than the checkpointed position.
+            Called by extract_info() and extract_info_lazy() """
+        if not os.path.exists( self.checkpoint_filepath ):
+            log.info( 'no checkpoint at ``{}``; starting from the beginning'.format(self.checkpoint_filepath) )
+            return None
+        with open( self.checkpoint_filepath ) as fh:
+            state = json.load( fh )
+        stat = os.stat( self.marc_filepath )
+        if ( state['source_size'], state['source_mtime_ns'] ) != ( stat.st_size, stat.st_mtime_ns ):
+            log.warning( 'marc file changed since checkpoint; starting from the beginning' )
+            return None
+        sink_filepath = state.get( 'sink_filepath' )
+        configured_filepath = self.sink_filepath or settings.SINK_FILEPATH or None
+        saved_sink = ( os.path.abspath(sink_filepath), state.get('sink_format') ) if sink_filepath else None
+        configured_sink = ( os.path.abspath(configured_filepath), self.sink_format or settings.SINK_FORMAT ) if configured_filepath else None
+        if saved_sink != configured_sink:  # resuming into another sink would truncate an unrelated file, or lose the rows before the checkpoint
+            log.warning( 'checkpoint was written with sink `{saved}`, but this run has sink `{now}`; discarding checkpoint & starting from the beginning'.format(
+                saved=saved_sink, now=configured_sink ) )
+            self.clear_checkpoint()
+            return None
+        if sink_filepath:
+            if not os.path.exists( sink_filepath ) or os.path.getsize( sink_filepath ) < state['sink_position']:
+                log.warning( 'sink ``{fp}`` missing or shorter than checkpoint position `{pos}`; discarding checkpoint & starting from the beginning'.format(
+                    fp=sink_filepath, pos=state['sink_position'] ) )
+                self.clear_checkpoint()
+                return None
+        log.info( 'resuming from checkpoint, ```{}```'.format(state) )
+        return state
+
+    def resume_from( self, state ):
+        """ Restores the record-count from checkpoint-state; returns the byte offset to start reading at.
+            Called by extract_info() and extract_info_lazy() """
+        if state is None:
+            return 0
+        self.count = state['count']
+        return state['offset']
+
+    def checkpoint_if_due( self, offset ):
+        """ Saves a checkpoint every settings.CHECKPOINT_EVERY records; offset is where the next record starts.
+            Called by extract_info() and extract_info_lazy() """
+        if self.count % settings.CHECKPOINT_EVERY == 0 and ( self.sink is None or self.sink.resumable ):
+            self.save_checkpoint( offset )
+        return
+
+    def save_checkpoint( self, offset ):
+        """ Flushes the sink, then atomically writes byte offset, record count & sink position to the checkpoint file.
+            Called by checkpoint_if_due() """
+        stat = os.stat( self.marc_filepath )
+        state = {
+            'marc_filepath': self.marc_filepath, 'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns,
+            'offset': offset, 'count': self.count,
+            'sink_filepath': self.sink.filepath if self.sink else None,
+            'sink_format': ( self.sink_format or settings.SINK_FORMAT ) if self.sink else None,
+            'sink_position': self.sink.tell() if self.sink else None }
+        temp_filepath = '{}.tmp'.format( self.checkpoint_filepath )
+        with open( temp_filepath, 'w' ) as fh:
+            json.dump( state, fh )
+        os.replace( temp_filepath, self.checkpoint_filepath )
+        log.debug( 'checkpoint saved, ```{}```'.format(state) )
+        return
+
+    def clear_checkpoint( self ):
+        """ Removes the checkpoint once a run completes, so the next run starts fresh.
+            Called by extract_info() and extract_info_lazy() """
+        if os.path.exists( self.checkpoint_filepath ):
+            os.remove( self.checkpoint_filepath )
+        return
+
+    def log_basic_info( self, basic_info=None ):
+        """ Assembles extracted info (unless a selector-row is passed in) & hands it to the output sink; logs it when no sink is configured.
+            Called by extract_info() and extract_info_selected() """
+        if basic_info is None:
+            basic_info = { 'title': self.title, 'bib_id': self.bib_id, 'item_id': self.item_id }
+        if self.sink:
+            self.sink.write( basic_info )
+            self.timer.lap( 'output' )
+        else:
+            log.info( 'basic_info, ```{}```'.format( pprint.pformat(basic_info) ) )
+            self.timer.lap( 'logging' )
         return
 
-    def update_count( self ):
-        """ Updates count and process-reporting.
+    def start_progress( self, position ):
+        """ Starts the stage-timer & progress-reporter for a run beginning at byte position.
+            Called by the extract_info*() methods """
+        self.timer.restart()
+        total_bytes = os.path.getsize( self.marc_filepath ) if can_memory_map( self.marc_filepath, self.detected ) else None  # other positions are decompressed or transcoded
+        self.progress = ProgressReporter( total_bytes, self.count, position )
+        return
+
+    def update_count( self, position=None ):
+        """ Updates count and process-reporting; position is how far into the file the run has read.
             Called by extract_info() """
         self.count+=1
-        if self.count % 10000 == 0:
+        if self.progress:
+            self.progress.update( self.count, position )
+        elif self.count % 10000 == 0:
             print( '`{}` records processed'.format(self.count) )
         return
 
+    def log_stage_summary( self ):
+        """ Logs & prints where the run's time went, per stage.
+            Called by the extract_info*() methods """
+        summary = self.timer.summary()
+        log.info( 'stage summary, ```{}```'.format( pprint.pformat(summary) ) )
+        print( '\n'.join(['`{stg}` -- `{sec}`s ({pct}%)'.format( stg=stage, sec=val['seconds'], pct=val['percent'] ) for (stage, val) in summary.items()]) )
+        if self.filtered_out:
+            log.info( 'filter, `{spec}`; records filtered out, `{cnt}`'.format( spec=self.record_filter.spec, cnt=self.filtered_out ) )
+            print( 'records filtered out, `{}`'.format(self.filtered_out) )
+        if self.error_counts:
+            log.warning( 'records skipped, ```{}```'.format(self.error_counts) )
+            print( 'records skipped, ```{}```'.format(self.error_counts) )
+        if self.decoder:
+            log.info( 'decode summary, ```{}```'.format( pprint.pformat(self.decoder.summary()) ) )
+            print( 'decode summary, ```{}```'.format(self.decoder.summary()) )
+        return summary
+
     ## end class Extractor()
 
 
+class RecordDecoder( object ):
+    """ Decodes raw records without force_utf8/utf8_handling='ignore' silently dropping bytes.
+        Records marked utf-8 in leader/09 take a fast path: one strict pymarc parse; if that fails, the record is rebuilt field by field,
+          each value tried as strict utf-8; in a failing value only the invalid bytes fall back to settings.DECODE_FALLBACK, so its valid utf-8 survives.
+        Records not marked utf-8 are trusted to be MARC-8 -- whose escape-sequences are plain ascii, so utf-8 would happily accept them --
+          and every value goes through marc8_to_unicode().
+        Every fallback & MARC-8 value is counted, by decoder & tag. """
+
+    def __init__( self, fallback=None ):
+        self.fallback = fallback or settings.DECODE_FALLBACK
+        self.errors = 'replace' if self.fallback == 'replace' else register_fallback_errors( self.fallback )
+        self.fast_records = 0
+        self.slow_records = 0
+        self.fallbacks = {}
+        self.fallback_tags = {}
+
+    def decode( self, raw ):
+        """ Returns a pymarc.Record for raw record bytes.
+            Called by Extractor.extract_info() """
+        if raw[9:10] == b'a':
+            try:
+                record = pymarc.Record( raw, force_utf8=True )  # strict
+                self.fast_records += 1
+                return record
+            except UnicodeDecodeError:
+                pass
+        self.slow_records += 1
+        return self.decode_per_field( raw )
+
+    def decode_per_field( self, raw ):
+        """ Mirrors pymarc's decode_marc(), but decodes each value on its own so one bad field can't cost the others.
+            Called by decode() """
+        decode_value = self.value_decoder( raw )
+        record = pymarc.Record( force_utf8=True )
+        record.leader = raw[0:LEADER_LEN].decode( 'ascii', 'replace' )
+        for ( tag, data ) in read_directory_fields( raw, None ):
+            tag = tag.decode( 'ascii', 'replace' )
+            if tag < '010' and tag.isdigit():
+                record.add_field( pymarc.Field(tag=tag, data=decode_value(data, tag)) )
+                continue
+            chunks = data.split( SUBFIELD_DELIMITER )
+            indicators = ( chunks[0].decode('ascii', 'replace') + '  ' )[0:2]  # pads missing indicators with blanks, as pymarc does
+            subfields = []
+            for chunk in chunks[1:]:
+                if chunk:
+                    subfields.extend( [chunk[0:1].decode('ascii', 'replace'), decode_value(chunk[1:], tag)] )
+            record.add_field( pymarc.Field(tag=tag, indicators=list(indicators), subfields=subfields) )
+        return record
+
+    def value_decoder( self, raw, count_record=False ):
+        """ Returns a `decode_value( data, tag )` callable bound to this record's leader/09 (raw needs only the leader).
+            With count_record, the record is tallied as decode() tallies it: fast if it's utf-8 & every value decodes strictly, else slow.
+            Called by decode_per_field() and the Extractor's lazy paths """
+        marc8 = raw[9:10] != b'a'
+        state = { 'fast': False }
+        if count_record:
+            if marc8:
+                self.slow_records += 1
+            else:
+                self.fast_records += 1
+                state['fast'] = True
+        def decode_value( data, tag ):
+            if marc8:
+                ( kind, value ) = ( 'marc8', pymarc.marc8_to_unicode(data, True) )
+            else:
+                try:
+                    return data.decode( 'utf-8' )
+                except UnicodeDecodeError:
+                    ( kind, value ) = ( self.fallback, data.decode('utf-8', self.errors) )
+                    if state['fast']:  # a utf-8 record that needed a fallback is a slow one after all
+                        ( self.fast_records, self.slow_records, state['fast'] ) = ( self.fast_records - 1, self.slow_records + 1, False )
+            self.fallbacks[kind] = self.fallbacks.get( kind, 0 ) + 1
+            self.fallback_tags[tag] = self.fallback_tags.get( tag, 0 ) + 1
+            log.debug( 'fallback decode; tag, `{tag}`; via, `{kind}`; data, ```{data}```'.format( tag=tag, kind=kind, data=data ) )
+            return value
+        return decode_value
+
+    def summary( self ):
+        """ Returns fast/slow record-counts & fallback-counts.
+            Called by Extractor.log_stage_summary() """
+        return { 'fast_records': self.fast_records, 'slow_records': self.slow_records,
+                 'fallbacks': self.fallbacks, 'fallback_tags': self.fallback_tags }
+
+    def merge( self, summary ):
+        """ Adds another decoder's summary() -- e.g. a worker's -- into this one's counts.
+            Called by Extractor.merge_worker_stats() """
+        self.fast_records += summary['fast_records']
+        self.slow_records += summary['slow_records']
+        for ( counts, other ) in ( (self.fallbacks, summary['fallbacks']), (self.fallback_tags, summary['fallback_tags']) ):
+            for ( key, cnt ) in other.items():
+                counts[key] = counts.get( key, 0 ) + cnt
+        return
+
+    ## end class RecordDecoder()
+
+
+class FieldSelectors( object ):
+    """ Compiles a selector spec like `title=245ab^?;bib_id=907@a[0:9];items=945y*` into a tag -> handlers table,
+          so one directory pass over a raw record fills every column, with no per-record scan of the whole record.
+        Each selector is `name=TAG` + an optional `@` + subfield-codes + an optional `[start:end]` slice of each value + an optional mode
+          + an optional `?`:
+          mode: none keeps the last match (as extract_bib() & extract_item() do); `^` looks at the first TAG field only (as record.title() does);
+            `*` collects every match into a list.
+          `@`: a field only matches when its leading subfield has the (single) code, as extract_bib()'s `subfields[0]['a']` does.
+          `?`: a column with no match is None rather than 'not_available' (as record.title() gives None).
+        With several codes, a field's value is the first value of the first code, followed -- only if that value is non-empty -- by the
+          first value of each later code present, space-joined (as record.title() does); a field without the first code doesn't match.
+        Each value is decoded on its own, so one bad byte can't send its neighbours through a fallback decoder.
+        Columns with no match are 'not_available' (or None with `?`, or [] for `*`). """
+
+    SELECTOR_PATTERN = re.compile(
+        r'^(?P<name>\w+)=(?P<tag>[0-9A-Za-z]{3})(?P<leading>@?)(?P<codes>[0-9a-z]+)(?:\[(?P<start>-?\d*):(?P<end>-?\d*)\])?(?P<mode>[*^]?)(?P<nullable>\??)$' )
+    MISSING = 'not_available'
+
+    def __init__( self, spec=None ):
+        self.spec = spec or settings.EXTRACT_SELECTORS
+        self.names = []
+        self.modes = []
+        self.missing = []
+        self.handlers = {}
+        for ( column, selector ) in enumerate( [part.strip() for part in self.spec.split(';') if part.strip()] ):
+            match = self.SELECTOR_PATTERN.match( selector )
+            if match is None:
+                raise ValueError( 'bad field-selector, `{}`; expected e.g. `bib_id=907a[0:9]`'.format(selector) )
+            if match.group( 'name' ) in self.names:
+                raise ValueError( 'duplicate field-selector name, `{}`'.format(match.group('name')) )
+            if match.group( 'leading' ) and len( match.group('codes') ) > 1:
+                raise ValueError( 'a leading-subfield selector takes one code, `{}`'.format(selector) )
+            self.names.append( match.group('name') )
+            self.modes.append( match.group('mode') )
+            self.missing.append( None if match.group('nullable') else self.MISSING )
+            value_slice = None
+            if match.group( 'start' ) is not None:
+                value_slice = slice( int(match.group('start') or 0), int(match.group('end')) if match.group('end') else None )
+            codes = [ code.encode('ascii') for code in match.group('codes') ]
+            self.handlers.setdefault( match.group('tag').encode('ascii'), [] ).append(
+                (column, codes, value_slice, match.group('mode'), bool(match.group('leading'))) )
+        if not self.names:
+            raise ValueError( 'empty field-selector spec' )
+        log.debug( 'compiled selectors, ```{}```'.format(self.handlers) )
+
+    def extract( self, raw, decode_value=None ):
+        """ Returns a `{ name: value }` row for one raw record; decode_value() is a RecordDecoder's, when given.
+            Called by Extractor.extract_info_selected() """
+        values = [ [] if mode == '*' else None for mode in self.modes ]
+        seen = set()  # columns whose first field has been looked at, for `^`
+        for ( tag, data ) in read_directory_fields( raw, self.handlers ):
+            chunks = [ chunk for chunk in data.split(SUBFIELD_DELIMITER)[1:] if chunk ]  # pymarc skips empty subfields too
+            decode = ( lambda val, tag=tag.decode('ascii'): decode_value(val, tag) ) if decode_value else ( lambda val: val.decode('utf-8', 'ignore') )
+            for ( column, codes, value_slice, mode, leading ) in self.handlers[tag]:
+                if mode == '^':
+                    if column in seen:
+                        continue
+                    seen.add( column )
+                if leading:
+                    found = [ chunks[0][1:] ] if chunks and chunks[0][0:1] == codes[0] else []
+                elif len( codes ) == 1:
+                    found = [ chunk[1:] for chunk in chunks if chunk[0:1] == codes[0] ]
+                else:
+                    found = []
+                    firsts = [ next((chunk[1:] for chunk in chunks if chunk[0:1] == code), None) for code in codes ]
+                    if firsts[0] is not None:
+                        value = decode( firsts[0] )
+                        for first in firsts[1:]:
+                            if value and first is not None:
+                                value += ' ' + decode( first )
+                        found = [ value ]
+                if not found:
+                    continue
+                if mode != '*':
+                    found = found[0:1] if mode == '^' else found[-1:]
+                found = [ val if isinstance(val, str) else decode(val) for val in found ]
+                if value_slice:
+                    found = [ val[value_slice] for val in found ]
+                if mode == '*':
+                    values[column].extend( found )
+                else:
+                    values[column] = found[0]
+        return { name: (missing if value is None else value) for (name, value, missing) in zip(self.names, values, self.missing) }
+
+    ## end class FieldSelectors()
+
+
+class RecordView( object ):
+    """ Read-only view of one record inside a shared buffer (a memory-map, or a record's own bytes); nothing is copied up front.
+        The leader & field-data come back as memoryview slices, the directory is walked entry by entry as fields are asked for, and subfield values are located
+          with buf.find() and only decoded when asked for -- so read-only jobs skip the Field objects & as_dict() copy of a pymarc.Record.
+        as_record() builds the real pymarc.Record on demand.
+        A view is only good while its buffer is open; use raw() to keep a record's bytes beyond that. """
+
+    __slots__ = ( 'buf', 'view', 'offset', 'length', '_base_address' )
+
+    def __init__( self, buf, offset=0, length=None, view=None ):
+        self.buf = buf
+        self.view = memoryview( buf ) if view is None else view  # shared by every record of a buffer
+        self.offset = offset
+        self.length = len( buf ) - offset if length is None else length
+        self._base_address = None
+
+    @property
+    def leader( self ):
+        return self.view[self.offset:self.offset+LEADER_LEN]
+
+    @property
+    def base_address( self ):
+        """ Absolute buffer-position of the first field. """
+        if self._base_address is None:
+            self._base_address = self.offset + int( self.buf[self.offset+12:self.offset+17] )
+        return self._base_address
+
+    def iter_fields( self, wanted_tags=None ):
+        """ Yields `( tag, start, end )` -- absolute buffer-positions of the field's data, minus its field-terminator --
+              for each field whose tag is in wanted_tags (or every field, if wanted_tags is None).
+            Walks the directory as read_directory_fields() does: the 3-byte tag is compared first, and only wanted entries get their
+              length & offset parsed; nothing is kept, so a second call walks the directory again.
+            Called by Extractor.extract_record_view() and RecordFilter.test() """
+        ( buf, base_address ) = ( self.buf, self.base_address )
+        for entry_start in range( self.offset+LEADER_LEN, base_address-1, DIRECTORY_ENTRY_LEN ):
+            tag = buf[entry_start:entry_start+3]
+            if wanted_tags is None or tag in wanted_tags:
+                field_start = base_address + int( buf[entry_start+7:entry_start+12] )
+                yield ( tag, field_start, field_start + int(buf[entry_start+3:entry_start+7]) - 1 )
+
+    def field_data( self, start, end ):
+        return self.view[start:end]
+
+    def iter_subfields( self, start, end ):
+        """ Yields `( code, value_start, value_end )` for each non-empty subfield of the field-data at start:end, as split_subfields() sees them. """
+        ( buf, position ) = ( self.buf, self.buf.find(SUBFIELD_DELIMITER, start, end) )
+        while position != -1:
+            next_position = buf.find( SUBFIELD_DELIMITER, position+1, end )
+            chunk_end = end if next_position == -1 else next_position
+            if chunk_end > position + 1:
+                yield ( buf[position+1:position+2], position+2, chunk_end )
+            position = next_position
+
+    def decode( self, start, end, tag=None, decode_value=None ):
+        """ Decodes buf[start:end] as split_subfields() would -- utf-8 with 'ignore', or via a RecordDecoder's decode_value(). """
+        if decode_value:
+            return decode_value( self.buf[start:end], tag.decode('ascii') )
+        return str( self.view[start:end], 'utf-8', 'ignore' )
+
+    def find_subfield( self, start, end, code, last=False ):
+        """ Returns `( value_start, value_end )` of the first (or last) subfield code within the field-data at start:end, or None.
+            One buf.find() (or rfind()) for delimiter+code, rather than a walk of every subfield. """
+        ( buf, marker ) = ( self.buf, SUBFIELD_DELIMITER + code )
+        position = buf.rfind( marker, start, end ) if last else buf.find( marker, start, end )
+        if position == -1:
+            return None
+        value_end = buf.find( SUBFIELD_DELIMITER, position+2, end )
+        return ( position+2, end if value_end == -1 else value_end )
+
+    def first_value( self, tag, start, end, code, decode_value=None ):
+        """ Returns the decoded first value of subfield code within the tag field at start:end, or None. """
+        span = self.find_subfield( start, end, code )
+        return None if span is None else self.decode( span[0], span[1], tag, decode_value )
+
+    def raw( self ):
+        """ Returns a copy of the record's bytes. """
+        return self.buf[self.offset:self.offset+self.length]
+
+    def as_record( self ):
+        """ Returns the full pymarc.Record, read as MARCReader does with force_utf8 & utf8_handling='ignore'. """
+        return pymarc.Record( self.raw(), force_utf8=True, utf8_handling='ignore' )
+
+    ## end class RecordView()
+
+
+class RecordFilter( object ):
+    """ A record predicate tested on raw directory & field bytes, so non-matching records are dropped before any decode or pymarc parse.
+        The spec is `;`-separated clauses, all of which must hold; `!` in front negates one:
+          `856` -- has an 856
+          `945l=loc3` -- some 945 has a $l exactly `loc3`
+          `245a~history` -- some 245 has a $a containing `history`
+        Values are compared as utf-8 bytes. A value clause first checks the value occurs anywhere in the record -- one buf.find() --
+          so most non-matching records never get their directory read. """
+
+    CLAUSE_PATTERN = re.compile( r'^(?P<negate>!?)(?P<tag>[0-9A-Za-z]{3})(?:(?P<code>[0-9a-z])(?P<op>[=~])(?P<value>.+))?$' )
+
+    def __init__( self, spec=None ):
+        self.spec = spec or settings.RECORD_FILTER
+        self.clauses = []
+        for clause in [ part.strip() for part in self.spec.split(';') if part.strip() ]:
+            match = self.CLAUSE_PATTERN.match( clause )
+            if match is None:
+                raise ValueError( 'bad record-filter clause, `{}`; expected e.g. `856`, `945l=loc3` or `!245a~history`'.format(clause) )
+            self.clauses.append( (
+                bool( match.group('negate') ), match.group( 'tag' ).encode( 'ascii' ),
+                match.group( 'code' ).encode( 'ascii' ) if match.group( 'code' ) else None,
+                match.group( 'op' ), match.group( 'value' ).encode( 'utf-8' ) if match.group( 'value' ) else None ) )
+        if not self.clauses:
+            raise ValueError( 'empty record-filter spec' )
+        log.debug( 'record-filter clauses, ```{}```'.format(self.clauses) )
+
+    def matches( self, view ):
+        """ Returns True if a RecordView passes every clause.
+            Called by Extractor.passes_filter() and split_records() """
+        for ( negate, tag, code, op, value ) in self.clauses:
+            if self.test( view, tag, code, op, value ) == negate:
+                return False
+        return True
+
+    def test( self, view, tag, code, op, value ):
+        """ Evaluates one (un-negated) clause.
+            Called by matches() """
+        if value is not None and view.buf.find( value, view.offset, view.offset+view.length ) == -1:
+            return False
+        for ( field_tag, start, end ) in view.iter_fields( (tag,) ):
+            if code is None:
+                return True
+            for ( subfield_code, value_start, value_end ) in view.iter_subfields( start, end ):
+                if subfield_code != code:
+                    continue
+                if op == '=':
+                    if value_end - value_start == len( value ) and view.buf[value_start:value_end] == value:
+                        return True
+                elif view.buf.find( value, value_start, value_end ) != -1:
+                    return True
+        return False
+
+    ## end class RecordFilter()
+
+
+class StageTimer( object ):
+    """ Accumulates wall-time & call-counts per pipeline stage.
+        Each lap() charges the time since the previous lap() to the named stage -- one perf_counter() call,
+          cheap enough to leave on in production. """
+
+    def __init__( self ):
+        self.seconds = {}
+        self.calls = {}
+        self.last = time.perf_counter()
+
+    def restart( self ):
+        """ Resets the lap-clock, so set-up time isn't charged to the first stage.
+            Called by Extractor.start_progress() """
+        self.last = time.perf_counter()
+
+    def lap( self, stage ):
+        """ Charges the time since the previous lap to stage. """
+        now = time.perf_counter()
+        self.seconds[stage] = self.seconds.get( stage, 0.0 ) + now - self.last
+        self.calls[stage] = self.calls.get( stage, 0 ) + 1
+        self.last = now
+
+    def summary( self ):
+        """ Returns `{ stage: {seconds, calls, percent} }`, slowest stage first.
+            Called by Extractor.log_stage_summary() """
+        total = sum( self.seconds.values() ) or 1.0
+        return { stage: {'seconds': round(seconds, 3), 'calls': self.calls[stage], 'percent': round(100*seconds/total, 1)}
+                 for (stage, seconds) in sorted(self.seconds.items(), key=lambda item: -item[1]) }
+
+    ## end class StageTimer()
+
+
+class ProgressReporter( object ):
+    """ Prints (and logs) a progress-line -- count, rate, percent of bytes consumed & eta -- at most every settings.PROGRESS_INTERVAL_SECONDS.
+        The clock is only read every 1024 records. """
+
+    def __init__( self, total_bytes, start_count=0, start_position=0, interval_seconds=None ):
+        self.total_bytes = total_bytes
+        self.start_count = start_count
+        self.start_position = start_position or 0
+        self.interval_seconds = settings.PROGRESS_INTERVAL_SECONDS if interval_seconds is None else interval_seconds
+        self.start_time = time.perf_counter()
+        self.next_report = self.start_time + self.interval_seconds
+
+    def update( self, count, position ):
+        """ Reports if the interval has passed.
+            Called by Extractor.update_count() """
+        if count & 1023:
+            return
+        now = time.perf_counter()
+        if now >= self.next_report:
+            self.next_report = now + self.interval_seconds
+            self.report( count, position, now )
+
+    def report( self, count, position, now ):
+        """ Builds & emits the progress-line.
+            Called by update() """
+        elapsed = max( now - self.start_time, 1e-9 )
+        rate = ( count - self.start_count ) / elapsed
+        if position and self.total_bytes:
+            byte_rate = ( position - self.start_position ) / elapsed
+            eta = datetime.timedelta( seconds=int((self.total_bytes-position) / byte_rate) ) if byte_rate else 'unknown'
+            line = '`{cnt}` records processed; `{rate:.0f}` records/sec; `{pct:.1f}%` of bytes; eta, `{eta}`'.format(
+                cnt=count, rate=rate, pct=100.0*position/self.total_bytes, eta=eta )
+        else:
+            line = '`{cnt}` records processed; `{rate:.0f}` records/sec'.format( cnt=count, rate=rate )
+        print( line )
+        log.info( line )
+
+    ## end class ProgressReporter()
+
+
+class RecordOffsetIndex( object ):
+    """ Manages a sidecar `<marc_filepath>.idx` file holding the (offset, length) of every well-formed record,
+          so record N can be read with a single seek instead of a scan.
+        The header stores the source file's size & mtime; a mismatch means the index is stale and gets rebuilt. """
+
+    MAGIC = b'PMEXIDX1'
+    HEADER = struct.Struct( '<8sQQQ' )  # magic, source-size, source-mtime-ns, record-count
+
+    def __init__( self, marc_filepath=None ):
+        self.marc_filepath = marc_filepath or settings.INPUT_FILEPATH
+        self.index_filepath = '{}.idx'.format( self.marc_filepath )
+        self.offsets = array.array( 'Q' )
+        self.lengths = array.array( 'I' )
+
+    def __len__( self ):
+        return len( self.offsets )
+
+    def source_signature( self ):
+        """ Returns (size, mtime-ns) of the marc file.
+            Called by load() and build() """
+        stat = os.stat( self.marc_filepath )
+        return ( stat.st_size, stat.st_mtime_ns )
+
+    def ensure( self ):
+        """ Loads the index, building it first if it's missing or stale. """
+        if not self.load():
+            self.build()
+        return self
+
+    def load( self ):
+        """ Loads the sidecar index; returns False if it's missing, truncated or corrupt, or no longer matches the marc file.
+            Called by ensure() """
+        if not os.path.exists( self.index_filepath ):
+            return False
+        try:
+            with open( self.index_filepath, 'rb' ) as fh:
+                ( magic, size, mtime_ns, record_count ) = self.HEADER.unpack( fh.read(self.HEADER.size) )
+                if magic != self.MAGIC or ( size, mtime_ns ) != self.source_signature():
+                    log.info( 'index stale or unrecognized, ``{}```'.format(self.index_filepath) )
+                    return False
+                if os.fstat( fh.fileno() ).st_size != self.HEADER.size + record_count * ( 8 + 4 ):
+                    log.warning( 'index size does not match its record-count, ``{}```'.format(self.index_filepath) )
+                    return False
+                self.offsets = array.array( 'Q' ); self.offsets.fromfile( fh, record_count )
+                self.lengths = array.array( 'I' ); self.lengths.fromfile( fh, record_count )
+        except ( struct.error, EOFError ) as e:
+            log.warning( 'index unreadable, ``{pth}``; error, `{err}`'.format( pth=self.index_filepath, err=repr(e) ) )
+            self.offsets = array.array( 'Q' ); self.lengths = array.array( 'I' )
+            return False
+        log.debug( 'loaded index of `{cnt}` records from ``{pth}```'.format( cnt=record_count, pth=self.index_filepath ) )
+        return True
+
+    def build( self ):
+        """ Walks the marc file once and writes the sidecar index.
+            Called by ensure() """
+        start = datetime.datetime.now()
+        ( size, mtime_ns ) = self.source_signature()
+        self.offsets = array.array( 'Q' ); self.lengths = array.array( 'I' )
+        with open_marc_buffer( self.marc_filepath ) as buf:
+            for ( offset, length, ok ) in walk_raw_records( buf ):
+                if ok:
+                    self.offsets.append( offset ); self.lengths.append( length )
+        temp_filepath = '{}.tmp'.format( self.index_filepath )
+        with open( temp_filepath, 'wb' ) as fh:
+            fh.write( self.HEADER.pack(self.MAGIC, size, mtime_ns, len(self.offsets)) )
+            self.offsets.tofile( fh )
+            self.lengths.tofile( fh )
+        os.replace( temp_filepath, self.index_filepath )
+        log.debug( 'indexed `{cnt}` records; time_taken, `{time}`'.format( cnt=len(self.offsets), time=datetime.datetime.now()-start ) )
+        return
+
+    def iter_raw( self, fh, start_record=0, end_record=None ):
+        """ Yields raw record bytes for index positions start_record up to (not including) end_record, seeking straight to the first. """
+        end_record = len( self.offsets ) if end_record is None else min( end_record, len(self.offsets) )
+        if start_record >= end_record:
+            return
+        fh.seek( self.offsets[start_record] )
+        for position in range( start_record, end_record ):
+            if fh.tell() != self.offsets[position]:  # malformed bytes were skipped at build-time
+                fh.seek( self.offsets[position] )
+            yield fh.read( self.lengths[position] )
+
+    def read_raw( self, fh, record_number ):
+        """ Returns the raw bytes of the record at index position record_number. """
+        fh.seek( self.offsets[record_number] )
+        return fh.read( self.lengths[record_number] )
+
+    ## end class RecordOffsetIndex()
+
+
+class RecordIdIndex( object ):
+    """ Manages a sidecar sqlite lookup-table, `<marc_filepath>.ids.sqlite`, mapping 907 bib_ids & 945$y item_ids to record byte offsets,
+          so a single record can be pulled without streaming the whole file.
+        Like RecordOffsetIndex, it's rebuilt when the marc file's size or mtime changes. """
+
+    def __init__( self, marc_filepath=None, db_filepath=None ):
+        self.marc_filepath = marc_filepath or settings.INPUT_FILEPATH
+        self.db_filepath = db_filepath or '{}.ids.sqlite'.format( self.marc_filepath )
+
+    def source_signature( self ):
+        """ Returns [size, mtime-ns] of the marc file, as stored in the meta table.
+            Called by is_current() and build() """
+        stat = os.stat( self.marc_filepath )
+        return [ stat.st_size, stat.st_mtime_ns ]
+
+    def is_current( self ):
+        """ Returns True if the index exists and matches the marc file.
+            Called by ensure() """
+        if not os.path.exists( self.db_filepath ):
+            return False
+        with contextlib.closing( sqlite3.connect(self.db_filepath) ) as db:
+            try:
+                row = db.execute( 'SELECT source_size, source_mtime_ns FROM meta' ).fetchone()
+            except sqlite3.DatabaseError:
+                return False
+        return row is not None and list( row ) == self.source_signature()
+
+    def ensure( self ):
+        """ Builds the index if it's missing or stale. """
+        if not self.is_current():
+            self.build()
+        return self
+
+    def build( self ):
+        """ Walks the marc file once, loading (id, kind, offset, length) rows, then indexes the id column.
+            Called by ensure() """
+        start = datetime.datetime.now()
+        signature = self.source_signature()
+        temp_filepath = '{}.tmp'.format( self.db_filepath )
+        if os.path.exists( temp_filepath ):
+            os.remove( temp_filepath )
+        count = 0
+        with contextlib.closing( sqlite3.connect(temp_filepath) ) as db:
+            db.execute( 'PRAGMA journal_mode=OFF' )
+            db.execute( 'PRAGMA synchronous=OFF' )
+            db.execute( 'CREATE TABLE meta ( source_size INTEGER, source_mtime_ns INTEGER )' )
+            db.execute( 'CREATE TABLE ids ( id TEXT, kind TEXT, offset INTEGER, length INTEGER )' )
+            db.execute( 'INSERT INTO meta VALUES ( ?, ? )', signature )
+            with open_marc_buffer( self.marc_filepath ) as buf:
+                rows = []
+                for ( offset, length, ok ) in walk_raw_records( buf ):
+                    if not ok:
+                        continue
+                    ( bib_id, item_ids ) = extract_raw_ids( buf[offset:offset+length] )
+                    if bib_id:
+                        rows.append( (bib_id, 'bib', offset, length) )
+                    rows.extend( (item_id, 'item', offset, length) for item_id in item_ids )
+                    count += 1
+                    if len( rows ) >= 50000:
+                        db.executemany( 'INSERT INTO ids VALUES ( ?, ?, ?, ? )', rows ); rows = []
+                db.executemany( 'INSERT INTO ids VALUES ( ?, ?, ?, ? )', rows )
+            db.execute( 'CREATE INDEX ids_id ON ids ( id )' )  # built after the load; much faster than maintaining it row-by-row
+            db.commit()
+        os.replace( temp_filepath, self.db_filepath )
+        log.debug( 'id-indexed `{cnt}` records; time_taken, `{time}`'.format( cnt=count, time=datetime.datetime.now()-start ) )
+        return
+
+    def lookup( self, record_id ):
+        """ Returns the raw bytes of every record carrying record_id as its bib_id or one of its item_ids. """
+        with contextlib.closing( sqlite3.connect(self.db_filepath) ) as db:
+            locations = db.execute( 'SELECT DISTINCT offset, length FROM ids WHERE id = ? ORDER BY offset', (record_id,) ).fetchall()
+        raws = []
+        with open( self.marc_filepath, 'rb' ) as fh:
+            for ( offset, length ) in locations:
+                fh.seek( offset )
+                raws.append( fh.read(length) )
+        log.debug( 'record_id, `{id}`; found, `{cnt}`'.format( id=record_id, cnt=len(raws) ) )
+        return raws
+
+    ## end class RecordIdIndex()
+
+
+class JsonlSink( object ):
+    """ Buffers extracted rows and writes them, flush_size at a time, as one json object per line. """
+
+    FIELDNAMES = [ 'title', 'bib_id', 'item_id' ]
+    resumable = True
+
+    def __init__( self, filepath, flush_size=1000, resume_position=None, fieldnames=None ):
+        self.filepath = filepath
+        self.fieldnames = fieldnames or self.FIELDNAMES
+        self.flush_size = flush_size
+        self.buffer = []
+        self.rows_written = 0
+        self.resuming = resume_position is not None
+        if self.resuming:
+            with open( filepath, 'r+b' ) as fh:
+                fh.truncate( resume_position )  # drops rows written after the checkpoint
+        self.fh = open( filepath, 'a' if self.resuming else 'w', encoding='utf-8', newline='' )
+        log.debug( 'sink opened, ``{fp}``; resume_position, `{pos}`'.format( fp=filepath, pos=resume_position ) )
+
+    def write( self, row ):
+        """ Buffers a row; flushes once flush_size rows are waiting.
+            Called by Extractor.log_basic_info() """
+        self.buffer.append( row )
+        if len( self.buffer ) >= self.flush_size:
+            self.flush()
+
+    def flush( self ):
+        """ Writes & clears the buffer.
+            Called by write() and close() """
+        if self.buffer:
+            self.write_rows( self.buffer )
+            self.rows_written += len( self.buffer )
+            self.buffer = []
+        self.fh.flush()
+
+    def write_rows( self, rows ):
+        """ Serializes a batch of rows.
+            Called by flush() """
+        self.fh.write( ''.join([json.dumps(row, ensure_ascii=False) + '\n' for row in rows]) )
+
+    def tell( self ):
+        """ Flushes, then returns the byte position of the end of the written rows.
+            Called by Extractor.save_checkpoint() """
+        self.flush()
+        return self.fh.buffer.tell()
+
+    def close( self ):
+        """ Flushes remaining rows & closes the file.
+            Called by Extractor.sink_session() """
+        self.flush()
+        self.fh.close()
+        log.debug( 'sink closed, ``{fp}``; rows_written, `{cnt}`'.format( fp=self.filepath, cnt=self.rows_written ) )
+
+    ## end class JsonlSink()
+
+
+class CsvSink( JsonlSink ):
+    """ Same buffering as JsonlSink, but writes csv with a header-row; list values (from `*` selectors) are joined with `|`. """
+
+    def __init__( self, filepath, flush_size=1000, resume_position=None, fieldnames=None ):
+        super( CsvSink, self ).__init__( filepath, flush_size, resume_position, fieldnames )
+        self.writer = csv.DictWriter( self.fh, fieldnames=self.fieldnames )
+        if not self.resuming:
+            self.writer.writeheader()
+
+    def write_rows( self, rows ):
+        """ Serializes a batch of rows.
+            Called by flush() """
+        self.writer.writerows( [{key: ('|'.join(val) if isinstance(val, list) else val) for (key, val) in row.items()} for row in rows] )
+
+    ## end class CsvSink()
+
+
+class ColumnarSink( object ):
+    """ Collects extracted rows into array-backed columns of uint32 ids pointing into an interned string-table,
+          and writes them on close as one compact file that ColumnarExtract can memory-map.
+        Layout: header | one uint32 column per field | uint64 string-offsets | utf-8 string-blob.
+        The file only exists once the run completes, so checkpoints are skipped (`resumable = False`). """
+
+    MAGIC = b'PMEXCOL1'
+    HEADER = struct.Struct( '<8sQQQ' )  # magic, row-count, string-count, blob-length
+    FIELDNAMES = JsonlSink.FIELDNAMES
+    NULL_ID = 0xFFFFFFFF  # e.g. a record with no 245$a has a None title
+    resumable = False
+
+    def __init__( self, filepath, flush_size=1000, resume_position=None, fieldnames=None ):
+        if resume_position is not None:
+            raise ValueError( 'the columnar sink can not resume from a checkpoint' )
+        if fieldnames and list( fieldnames ) != self.FIELDNAMES:
+            raise ValueError( 'the columnar sink only holds the {} columns'.format(self.FIELDNAMES) )
+        self.filepath = filepath
+        self.columns = [ array.array('I') for _ in self.FIELDNAMES ]
+        self.string_ids = {}
+        self.rows_written = 0
+        log.debug( 'columnar sink opened, ``{}```'.format(filepath) )
+
+    def write( self, row ):
+        """ Interns the row's values & appends their ids to the columns.
+            Called by Extractor.log_basic_info() """
+        for ( column, fieldname ) in zip( self.columns, self.FIELDNAMES ):
+            value = row[fieldname]
+            if value is None:
+                column.append( self.NULL_ID )
+                continue
+            string_id = self.string_ids.get( value )
+            if string_id is None:
+                string_id = self.string_ids[value] = len( self.string_ids )
+            column.append( string_id )
+        self.rows_written += 1
+
+    def seed( self, extract ):
+        """ Starts an empty sink with every row of a ColumnarExtract: its id-columns are copied whole, and only its string-table is
+              walked -- to rebuild the interning dict, so later write()s reuse existing ids. No row goes through write().
+            Called by ExtractCache.open() """
+        if self.rows_written:
+            raise ValueError( 'only an empty columnar sink can be seeded' )
+        for ( column, fieldname ) in zip( self.columns, self.FIELDNAMES ):
+            with extract.column_ids( fieldname ).cast( 'B' ) as column_bytes:  # frombytes() wants a byte-format buffer
+                column.frombytes( column_bytes )
+        ( offsets, blob ) = ( extract.string_offsets, extract.buf[extract.blob_start:extract.blob_start+extract.string_offsets[-1]] )
+        self.string_ids = { blob[offsets[string_id]:offsets[string_id+1]].decode('utf-8'): string_id for string_id in range(len(offsets)-1) }
+        self.rows_written = len( extract )
+        return
+
+    def flush( self ):
+        """ No-op; everything is written on close(). """
+        return
+
+    def close( self ):
+        """ Writes header, columns, string-offsets & string-blob.
+            Called by Extractor.sink_session() """
+        encoded = [ value.encode('utf-8') for value in self.string_ids ]  # dicts keep insertion-order, which is id-order
+        offsets = array.array( 'Q', [0] )
+        for value in encoded:
+            offsets.append( offsets[-1] + len(value) )
+        temp_filepath = '{}.tmp'.format( self.filepath )
+        with open( temp_filepath, 'wb' ) as fh:
+            fh.write( self.HEADER.pack(self.MAGIC, self.rows_written, len(encoded), offsets[-1]) )
+            for column in self.columns:
+                column.tofile( fh )
+            if ( fh.tell() % 8 ):
+                fh.write( b'\x00' * (8 - fh.tell() % 8) )  # keeps the uint64 offsets aligned
+            offsets.tofile( fh )
+            fh.write( b''.join(encoded) )
+        os.replace( temp_filepath, self.filepath )
+        log.debug( 'columnar sink closed, ``{fp}``; rows, `{rows}`; strings, `{strs}`'.format( fp=self.filepath, rows=self.rows_written, strs=len(encoded) ) )
+
+    ## end class ColumnarSink()
+
+
+class ColumnarExtract( object ):
+    """ Read-only, memory-mapped view of a ColumnarSink file.
+        Opening is O(1) -- nothing is parsed up front -- and strings are decoded only when asked for. """
+
+    def __init__( self, filepath ):
+        self.filepath = filepath
+        self.fh = open( filepath, 'rb' )
+        self.buf = mmap.mmap( self.fh.fileno(), 0, access=mmap.ACCESS_READ )
+        ( magic, self.row_count, string_count, blob_length ) = ColumnarSink.HEADER.unpack_from( self.buf, 0 )
+        if magic != ColumnarSink.MAGIC:
+            raise ValueError( 'not a columnar extract, ``{}```'.format(filepath) )
+        view = memoryview( self.buf )
+        position = ColumnarSink.HEADER.size
+        self.columns = {}
+        for fieldname in ColumnarSink.FIELDNAMES:
+            self.columns[fieldname] = view[position:position+4*self.row_count].cast( 'I' )
+            position += 4 * self.row_count
+        position += -position % 8
+        self.string_offsets = view[position:position+8*(string_count+1)].cast( 'Q' )
+        self.blob_start = position + 8 * ( string_count + 1 )
+
+    def __len__( self ):
+        return self.row_count
+
+    def string( self, string_id ):
+        """ Decodes one interned string; NULL_ID gives None. """
+        if string_id == ColumnarSink.NULL_ID:
+            return None
+        return self.buf[ self.blob_start+self.string_offsets[string_id] : self.blob_start+self.string_offsets[string_id+1] ].decode( 'utf-8' )
+
+    def column_ids( self, fieldname ):
+        """ Returns the raw uint32 id-column -- handy for counting & grouping without decoding any strings. """
+        return self.columns[fieldname]
+
+    def column( self, fieldname ):
+        """ Yields a column's decoded values. """
+        string = self.string
+        for string_id in self.columns[fieldname]:
+            yield string( string_id )
+
+    def row( self, row_number ):
+        """ Returns one row as a dict, like the `basic_info` of Extractor.log_basic_info(). """
+        return { fieldname: self.string(self.columns[fieldname][row_number]) for fieldname in ColumnarSink.FIELDNAMES }
+
+    def __iter__( self ):
+        for row_number in range( self.row_count ):
+            yield self.row( row_number )
+
+    def close( self ):
+        """ Releases the column-views before unmapping; mmap refuses to close while views are exported. """
+        for column in list( self.columns.values() ) + [ self.string_offsets ]:
+            column.release()
+        self.buf.close()
+        self.fh.close()
+
+    ## end class ColumnarExtract()
+
+
+class ExtractCache( object ):
+    """ Persistent cache of extracted (title, bib_id, item_id) rows, one ColumnarSink file per input file, keyed by its path.
+        An entry records the input's size & mtime, how far its rows cover (the end of the last good record), and a content fingerprint:
+          blake2b over every byte of that covered prefix. Hashing reads the whole prefix -- far cheaper than parsing it, but not free;
+          a change anywhere in it, not just near its ends, makes the entry stale.
+        Same size, mtime & fingerprint is a hit, served without parsing anything. A file that only grew (fingerprint of the old prefix
+          unchanged) keeps its cached rows -- their columns copied whole -- and only the appended tail is extracted; anything else is rebuilt.
+        Rows depend on settings.DECODE_MODE & DECODE_FALLBACK, so those are part of the entry too.
+        Past settings.EXTRACT_CACHE_MAX_MB, least-recently-used entries are evicted. """
+
+    def __init__( self, cache_dir=None, max_bytes=None ):
+        self.cache_dir = cache_dir or settings.EXTRACT_CACHE_DIR
+        self.max_bytes = max_bytes or settings.EXTRACT_CACHE_MAX_MB * 1024 * 1024
+        os.makedirs( self.cache_dir, exist_ok=True )
+
+    def entry_paths( self, marc_filepath ):
+        """ Returns `( columnar_filepath, meta_filepath )` for a marc file's entry. """
+        key = hashlib.blake2b( os.path.abspath(marc_filepath).encode('utf-8'), digest_size=12 ).hexdigest()
+        return ( os.path.join(self.cache_dir, key+'.col'), os.path.join(self.cache_dir, key+'.json') )
+
+    def hash_prefix( self, marc_filepath, end, digest=None, start=0 ):
+        """ Feeds the file's bytes start:end to a blake2b digest (a new one unless given, to carry on an earlier prefix's) & returns it.
+            Hashes straight from a memory-map, so nothing is copied. """
+        digest = digest or hashlib.blake2b( digest_size=16 )
+        with open_marc_buffer( marc_filepath ) as buf:
+            if len( buf ) < end:
+                raise ValueError( 'file shorter than the prefix to hash' )
+            with memoryview( buf ) as view, view[start:end] as prefix:
+                digest.update( prefix )
+        return digest
+
+    def load_meta( self, meta_filepath ):
+        try:
+            with open( meta_filepath ) as fh:
+                return json.load( fh )
+        except ( OSError, ValueError ):
+            return None
+
+    def open( self, marc_filepath, extract_range ):
+        """ Returns `( ColumnarExtract, status )` for a marc file; status is 'hit', 'appended' or 'built'.
+            On a miss, `extract_range( start_offset, sink )` writes rows for the records from start_offset & returns the end of the last good one.
+            Called by Extractor.extract_info_cached() """
+        ( columnar_filepath, meta_filepath ) = self.entry_paths( marc_filepath )
+        stat = os.stat( marc_filepath )
+        decode = [ settings.DECODE_MODE, settings.DECODE_FALLBACK ]
+        meta = self.load_meta( meta_filepath )
+        status = 'built'
+        if meta and meta['marc_filepath'] == os.path.abspath( marc_filepath ) and meta['decode'] == decode and os.path.exists( columnar_filepath ) \
+                and stat.st_size >= meta['size'] and meta['size'] >= meta['covered']:
+            prefix_digest = self.hash_prefix( marc_filepath, meta['covered'] )  # only the unchanged-size & grown cases are worth hashing
+            if prefix_digest.hexdigest() == meta['fingerprint']:
+                if ( stat.st_size, stat.st_mtime_ns ) == ( meta['size'], meta['mtime_ns'] ):
+                    status = 'hit'
+                elif stat.st_size > meta['size']:
+                    status = 'appended'
+        log.debug( 'cache entry, ``{col}``; status, `{st}`'.format( col=columnar_filepath, st=status ) )
+        if status != 'hit':
+            new_filepath = '{}.new'.format( columnar_filepath )
+            sink = ColumnarSink( new_filepath )
+            start_offset = 0
+            if status == 'appended':
+                cached = ColumnarExtract( columnar_filepath )
+                try:
+                    sink.seed( cached )
+                finally:
+                    cached.close()
+                start_offset = meta['covered']
+            covered = extract_range( start_offset, sink )
+            sink.close()
+            os.replace( new_filepath, columnar_filepath )
+            digest = self.hash_prefix( marc_filepath, covered, prefix_digest.copy(), start_offset ) if status == 'appended' else self.hash_prefix( marc_filepath, covered )
+            meta = { 'marc_filepath': os.path.abspath(marc_filepath), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'decode': decode,
+                     'covered': covered, 'fingerprint': digest.hexdigest() }
+        meta['last_used'] = time.time()
+        with open( meta_filepath, 'w' ) as fh:
+            json.dump( meta, fh )
+        self.evict( keep=columnar_filepath )
+        return ( ColumnarExtract(columnar_filepath), status )
+
+    def evict( self, keep=None ):
+        """ Deletes least-recently-used entries (never `keep`) until the cache fits in max_bytes.
+            Called by open() """
+        entries = []
+        for meta_filepath in glob.glob( os.path.join(self.cache_dir, '*.json') ):
+            columnar_filepath = meta_filepath[:-len('.json')] + '.col'
+            meta = self.load_meta( meta_filepath ) or {}
+            size = os.path.getsize( columnar_filepath ) if os.path.exists( columnar_filepath ) else 0
+            entries.append( (meta.get('last_used', 0), size, columnar_filepath, meta_filepath) )
+        total = sum( entry[1] for entry in entries )
+        for ( last_used, size, columnar_filepath, meta_filepath ) in sorted( entries ):
+            if total <= self.max_bytes:
+                break
+            if columnar_filepath == keep:
+                continue
+            for path in ( columnar_filepath, meta_filepath ):
+                if os.path.exists( path ):
+                    os.remove( path )
+            total -= size
+            log.debug( 'evicted cache entry, ``{}``'.format(columnar_filepath) )
+        return
+
+    ## end class ExtractCache()
+
+
+class SqliteSink( object ):
+    """ Bulk-loads extracted rows into a normalized sqlite database:
+          `bibs( record_id, bib_id, title )` -- one row per marc record -- and `items( item_id, record_id )`.
+        Every item comes from an `item_ids` list column (e.g. the `item_ids=945y*` selector of SQLITE_SELECTORS); rows with only the
+          single `item_id` extract_item() keeps load just that one. 'not_available' is stored as NULL.
+        Loads with WAL & synchronous=NORMAL, executemany() batches of flush_size rows (one cached, prepared statement per table),
+          and a commit every settings.SQLITE_TRANSACTION_ROWS rows; indexes are built once, after the load, then the finished database
+          replaces the file at filepath. A load that fails is discarded by abort(), leaving any earlier database in place.
+        Like ColumnarSink, it can't resume (`resumable = False`). """
+
+    SCHEMA = [
+        'CREATE TABLE bibs ( record_id INTEGER PRIMARY KEY, bib_id TEXT, title TEXT )',
+        'CREATE TABLE items ( item_id TEXT, record_id INTEGER REFERENCES bibs ( record_id ) )' ]
+    INDEXES = [
+        'CREATE INDEX bibs_bib_id ON bibs ( bib_id )',
+        'CREATE INDEX items_item_id ON items ( item_id )',
+        'CREATE INDEX items_record_id ON items ( record_id )' ]
+    MISSING = 'not_available'
+    resumable = False
+
+    def __init__( self, filepath, flush_size=1000, resume_position=None, fieldnames=None ):
+        if resume_position is not None:
+            raise ValueError( 'the sqlite sink can not resume from a checkpoint' )
+        fieldnames = fieldnames or JsonlSink.FIELDNAMES
+        if 'bib_id' not in fieldnames or 'title' not in fieldnames:
+            raise ValueError( 'the sqlite sink needs bib_id & title columns; got, `{}`'.format(fieldnames) )
+        self.filepath = filepath
+        self.temp_filepath = '{}.tmp'.format( filepath )
+        self.flush_size = flush_size
+        self.bib_rows = []
+        self.item_rows = []
+        self.rows_written = 0
+        self.items_written = 0
+        self.uncommitted = 0
+        self.remove_temp_files()
+        self.db = sqlite3.connect( self.temp_filepath, isolation_level=None )  # transactions are managed explicitly
+        self.db.execute( 'PRAGMA journal_mode=WAL' )
+        self.db.execute( 'PRAGMA synchronous=NORMAL' )
+        self.db.execute( 'PRAGMA cache_size=-65536' )  # 64MB
+        for statement in self.SCHEMA:
+            self.db.execute( statement )
+        self.db.execute( 'BEGIN' )
+        log.debug( 'sqlite sink opened, ``{}```'.format(filepath) )
+
+    def write( self, row ):
+        """ Buffers a bib row & its item rows; flushes once flush_size records are waiting.
+            Called by Extractor.log_basic_info() """
+        record_id = self.rows_written + len( self.bib_rows ) + 1
+        bib_id = row['bib_id']
+        self.bib_rows.append( (record_id, None if bib_id == self.MISSING else bib_id, None if row['title'] == self.MISSING else row['title']) )
+        item_ids = row.get( 'item_ids' )
+        if item_ids is None:
+            item_ids = [] if row.get( 'item_id', self.MISSING ) == self.MISSING else [ row['item_id'] ]
+        self.item_rows.extend( (item_id, record_id) for item_id in item_ids )
+        if len( self.bib_rows ) >= self.flush_size:
+            self.flush()
+
+    def flush( self ):
+        """ Inserts the buffered rows; commits & starts a new transaction every SQLITE_TRANSACTION_ROWS records. """
+        if self.bib_rows:
+            self.db.executemany( 'INSERT INTO bibs VALUES ( ?, ?, ? )', self.bib_rows )
+            self.db.executemany( 'INSERT INTO items VALUES ( ?, ? )', self.item_rows )
+            self.rows_written += len( self.bib_rows )
+            self.items_written += len( self.item_rows )
+            self.uncommitted += len( self.bib_rows )
+            self.bib_rows = []; self.item_rows = []
+        if self.uncommitted >= settings.SQLITE_TRANSACTION_ROWS:
+            self.db.execute( 'COMMIT' )
+            self.db.execute( 'BEGIN' )
+            self.uncommitted = 0
+        return
+
+    def close( self ):
+        """ Loads what's left, builds the indexes, folds the WAL back into the database & moves it into place.
+            The database is only promoted once all of that succeeds; otherwise it's discarded.
+            Called by Extractor.sink_session() """
+        start = datetime.datetime.now()
+        try:
+            self.flush()
+            self.db.execute( 'COMMIT' )
+            for statement in self.INDEXES:
+                self.db.execute( statement )
+            self.db.execute( 'ANALYZE' )
+            self.db.execute( 'PRAGMA wal_checkpoint(TRUNCATE)' )
+            self.db.execute( 'PRAGMA journal_mode=DELETE' )  # a single self-contained file for analysts
+            self.db.close()
+        except BaseException:
+            self.abort()
+            raise
+        os.replace( self.temp_filepath, self.filepath )
+        log.debug( 'sqlite sink closed, ``{fp}``; bibs, `{bibs}`; items, `{items}`; index time, `{time}`'.format(
+            fp=self.filepath, bibs=self.rows_written, items=self.items_written, time=datetime.datetime.now()-start ) )
+
+    def abort( self ):
+        """ Discards a failed load: closes the connection & deletes the temp database, so a partial load never replaces filepath.
+            Called by Extractor.sink_session() and close() """
+        try:
+            self.db.close()
+        except sqlite3.Error as e:
+            log.warning( 'closing aborted sqlite load, ```{}```'.format(repr(e)) )
+        self.remove_temp_files()
+        log.warning( 'sqlite load aborted after `{}` bibs; temp database discarded, ``{}``'.format(self.rows_written, self.temp_filepath) )
+
+    def remove_temp_files( self ):
+        """ Deletes the temp database & its WAL/shared-memory files, if present.
+            Called by __init__() and abort() """
+        for path in ( self.temp_filepath, self.temp_filepath+'-wal', self.temp_filepath+'-shm' ):
+            if os.path.exists( path ):
+                os.remove( path )
+        return
+
+    ## end class SqliteSink()
+
+
+SINK_CLASSES = { 'jsonl': JsonlSink, 'csv': CsvSink, 'columnar': ColumnarSink, 'sqlite': SqliteSink }
+
+
+def make_sink( filepath=None, sink_format=None, flush_size=None, resume_position=None, fieldnames=None ):
+    """ Returns the output sink configured in settings, or None if no SINK_FILEPATH is set.
+        Called by Extractor.sink_session() """
+    filepath = filepath or settings.SINK_FILEPATH
+    if not filepath:
+        return None
+    sink_class = SINK_CLASSES[ sink_format or settings.SINK_FORMAT ]
+    return sink_class( filepath, flush_size or settings.SINK_FLUSH_SIZE, resume_position, fieldnames )
+
+
 #####################################
 ## experimentation functions below ##
 #####################################
@@ -133,11 +1666,16 @@ def break_up_record( start_record=0, end_record=0 ):
     start_time = datetime.datetime.now()
     count = 0
 
-    with open( BIG_MARC_FILEPATH, 'rb' ) as input_fh:
+    detected = detect_input( BIG_MARC_FILEPATH )
+    input_format = detected[1]
+
+    with open_marc_input( BIG_MARC_FILEPATH, detected ) as input_fh:
         # reader = pymarc.MARCReader( input_fh, force_utf8=True, utf8_handling='ignore' )
         # reader = pymarc.MARCReader( input_fh )
         # reader = pymarc.MARCReader( input_fh, to_unicode=True )
         reader = pymarc.MARCReader( input_fh, to_unicode=True, utf8_handling='ignore' )  # works!
+        if input_format != 'marc':
+            reader = iter_structured_records( input_fh, input_format )  # MARCXML or MARC-in-JSON in, ISO 2709 out
 
         with open( SMALLER_OUTPUT_FILEPATH, 'wb' ) as output_fh:
             writer = pymarc.MARCWriter( output_fh )
@@ -158,6 +1696,23 @@ def break_up_record( start_record=0, end_record=0 ):
     ## end def break_up_record()
 
 
+def break_up_record_indexed( start_record=0, end_record=0 ):
+    """ Like break_up_record(), but seeks straight to start_record via the sidecar offset-index,
+          and copies the original record bytes rather than re-serializing them.
+        Record numbers are 1-based & inclusive, as in break_up_record(). """
+    log.debug( 'start_record, `{st}`; end_record, `{en}`'.format( st=start_record, en=end_record ) )
+    start_time = datetime.datetime.now()
+    index = RecordOffsetIndex( settings.INPUT_FILEPATH ).ensure()
+    count = 0
+    with open( settings.INPUT_FILEPATH, 'rb' ) as input_fh:
+        with open( settings.OUTPUT_FILEPATH, 'wb' ) as output_fh:
+            for raw in index.iter_raw( input_fh, max(start_record-1, 0), end_record ):
+                output_fh.write( raw )
+                count += 1
+    log.debug( 'records written, `{cnt}`; time_taken, `{time}`'.format( cnt=count, time=datetime.datetime.now()-start_time ) )
+    return count
+
+
 def extract_info():
     """ Prints/logs certain record elements.
         The ```utf8_handling='ignore'``` is required to avoid a unicode-error.
@@ -223,8 +1778,12 @@ def count_records():
         The ```utf8_handling='ignore'``` is required to avoid a unicode-error, so trapping the errant-record isn't possible this way.
         """
     big_marc_filepath = settings.INPUT_FILEPATH
-    with open( big_marc_filepath, 'rb' ) as fh:
+    detected = detect_input( big_marc_filepath )
+    input_format = detected[1]
+    with open_marc_input( big_marc_filepath, detected ) as fh:
         reader = pymarc.MARCReader( fh, force_utf8=True, utf8_handling='ignore' )  # w/o 'ignore', this line can generate a unicode-error
+        if input_format != 'marc':
+            reader = iter_structured_records( fh, input_format )
         start = datetime.datetime.now()
         count = 0
         for record in reader:
@@ -293,3 +1852,1063 @@ def count_records_and_log_bad_record():
     log.debug( 'count_bad, `{}`'.format(count_bad) )
     log.debug( 'count_segments_to_review, `{}`'.format(count_segments_to_review) )
     log.debug( 'time_taken, `{}`'.format(end-start) )
+
+
+COMPRESSION_MAGIC = [ (b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'xz') ]
+COMPRESSED_OPENERS = { 'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open }
+
+
+def detect_compression( marc_filepath ):
+    """ Returns 'gzip', 'bz2' or 'xz' from the file's magic bytes (not its extension), or None for a plain file. """
+    with open( marc_filepath, 'rb' ) as fh:
+        head = fh.read( 6 )
+    return next( (name for (magic, name) in COMPRESSION_MAGIC if head.startswith(magic)), None )
+
+
+def detect_input( marc_filepath ):
+    """ Returns `( compression, input_format )`: compression as detect_compression() names it, and 'marcxml', 'marc_json' (line-delimited
+          MARC-in-JSON) or 'marc' (ISO 2709), from the first non-blank bytes of the (decompressed) input.
+        Costs one small unbuffered read -- plus one small decompressing read for compressed files; callers that need it more than once
+          detect once & pass the result down as `detected`. """
+    with open( marc_filepath, 'rb' ) as fh:
+        head = fh.read( 4096 )
+    compression = next( (name for (magic, name) in COMPRESSION_MAGIC if head.startswith(magic)), None )
+    if compression is not None:
+        with COMPRESSED_OPENERS[compression]( marc_filepath, 'rb' ) as fh:
+            head = fh.read( 4096 )
+    head = head.lstrip( b'\xef\xbb\xbf \t\r\n' )  # skips a utf-8 bom & blank lines
+    if head.startswith( b'<' ):
+        return ( compression, 'marcxml' )
+    if head.startswith( b'{' ):
+        return ( compression, 'marc_json' )
+    return ( compression, 'marc' )
+
+
+def can_memory_map( marc_filepath, detected=None ):
+    """ True for plain ISO 2709 files -- the ones the memory-map & sharding paths can walk directly. """
+    return ( detected or detect_input(marc_filepath) ) == ( None, 'marc' )
+
+
+def iter_structured_records( fh, input_format ):
+    """ Yields pymarc.Records from a MARCXML or line-delimited MARC-in-JSON binary stream, one record in memory at a time.
+        Called by Extractor.iter_decoded_records(), iter_raw_input(), count_records() and break_up_record() """
+    if input_format == 'marcxml':
+        return iter_marcxml_records( fh )
+    if input_format == 'marc_json':
+        return iter_marc_json_records( fh )
+    raise ValueError( 'unknown structured input format, `{}`'.format(input_format) )
+
+
+def iter_marcxml_records( fh ):
+    """ Yields a pymarc.Record per MARCXML `record` element (namespaced or not) via iterparse;
+          each element -- and the root's hold on it -- is cleared once converted, so memory stays flat however big the file.
+        Called by iter_structured_records() """
+    root = None
+    for ( event, element ) in ElementTree.iterparse( fh, events=('start', 'end') ):
+        if root is None:
+            root = element
+        if event == 'end' and element.tag.rsplit( '}', 1 )[-1] == 'record':
+            yield marcxml_to_record( element )
+            element.clear()
+            root.clear()
+
+
+def marcxml_to_record( element ):
+    """ Builds a pymarc.Record from a MARCXML `record` element.
+        Called by iter_marcxml_records() """
+    record = pymarc.Record( force_utf8=True )
+    for child in element:
+        name = child.tag.rsplit( '}', 1 )[-1]
+        if name == 'leader':
+            record.leader = child.text or record.leader
+        elif name == 'controlfield':
+            record.add_field( pymarc.Field(tag=child.get('tag'), data=child.text or '') )
+        elif name == 'datafield':
+            subfields = []
+            for subfield in child:
+                subfields.extend( [subfield.get('code'), subfield.text or ''] )
+            record.add_field( pymarc.Field(tag=child.get('tag'), indicators=[child.get('ind1', ' '), child.get('ind2', ' ')], subfields=subfields) )
+    return record
+
+
+def iter_marc_json_records( fh ):
+    """ Yields a pymarc.Record per line of MARC-in-JSON -- `{"leader": ..., "fields": [{"001": ...}, {"245": {"ind1", "ind2", "subfields": [...]}}]}`.
+        Called by iter_structured_records() """
+    for line in fh:
+        if line.strip():
+            yield marc_json_to_record( json.loads(line) )
+
+
+def marc_json_to_record( dct ):
+    """ Builds a pymarc.Record from a MARC-in-JSON dict, the shape record.as_dict() produces.
+        Called by iter_marc_json_records() """
+    record = pymarc.Record( force_utf8=True )
+    record.leader = dct.get( 'leader' ) or record.leader
+    for field_dct in dct.get( 'fields', [] ):
+        for ( tag, value ) in field_dct.items():
+            if not isinstance( value, dict ):
+                record.add_field( pymarc.Field(tag=tag, data=value) )
+                continue
+            subfields = []
+            for subfield_dct in value.get( 'subfields', [] ):
+                for ( code, subfield_value ) in subfield_dct.items():
+                    subfields.extend( [code, subfield_value] )
+            record.add_field( pymarc.Field(tag=tag, indicators=[value.get('ind1', ' '), value.get('ind2', ' ')], subfields=subfields) )
+    return record
+
+
+def open_marc_input( marc_filepath, detected=None ):
+    """ Opens a plain or compressed marc file as a binary stream with a large read-buffer.
+        Decompression happens on the fly, so nothing is unpacked to disk. """
+    compression = detected[0] if detected else detect_compression( marc_filepath )
+    log.debug( 'opening ``{fp}``; compression, `{cmp}`'.format( fp=marc_filepath, cmp=compression ) )
+    if compression is None:
+        return open( marc_filepath, 'rb', buffering=settings.READ_BUFFER_SIZE )
+    return io.BufferedReader( COMPRESSED_OPENERS[compression](marc_filepath, 'rb'), buffer_size=settings.READ_BUFFER_SIZE )
+
+
+def iter_raw_input( marc_filepath, start=0, detected=None ):
+    """ Yields `( offset, length, ok, raw )` for each record, as walk_raw_records() does;
+          over a memory-map for plain files, or via walk_raw_stream() for compressed ones.
+        MARCXML & MARC-in-JSON records are transcoded to ISO 2709 (record.as_marc()) on the way, so every raw-record path takes them;
+          their offsets are positions in that transcoded stream.
+        Called by Extractor.extract_info_lazy() and count_records_fast() """
+    detected = detected or detect_input( marc_filepath )
+    ( compression, input_format ) = detected
+    if input_format != 'marc':
+        with open_marc_input( marc_filepath, detected ) as fh:
+            offset = 0
+            for record in iter_structured_records( fh, input_format ):
+                raw = record.as_marc()
+                if offset >= start:
+                    yield ( offset, len(raw), True, raw )
+                offset += len( raw )
+    elif compression is None:
+        with open_marc_buffer( marc_filepath ) as buf:
+            for ( offset, length, ok ) in walk_raw_records( buf, start=start ):
+                yield ( offset, length, ok, buf[offset:offset+length] )
+    else:
+        with open_marc_input( marc_filepath, detected ) as fh:
+            fh.seek( start )
+            for entry in walk_raw_stream( fh, start ):
+                yield entry
+
+
+def walk_raw_stream( fh, start=0 ):
+    """ Stream version of walk_raw_records(), for input that can't be memory-mapped; yields `( offset, length, ok, raw )`.
+        Keeps at least one maximum-length record in its window, so the length & resync rules match walk_raw_records() exactly.
+        Called by iter_raw_input() """
+    window = b''; position = 0; window_offset = start; eof = False
+    while True:
+        if len( window ) - position <= MAX_RECORD_LEN and not eof:
+            chunk = fh.read( settings.READ_BUFFER_SIZE )
+            eof = not chunk
+            window = window[position:] + chunk
+            window_offset += position
+            position = 0
+        if position >= len( window ):
+            return
+        length_bytes = window[position:position+5]
+        length = int( length_bytes ) if length_bytes.isdigit() else 0
+        record_end = position + length
+        if length >= LEADER_LEN and record_end <= len( window ) and window[record_end-1:record_end] == RECORD_TERMINATOR:
+            ok = True
+        else:
+            ok = False
+            record_end = find_resync_position( window, position, len(window) )
+        yield ( window_offset+position, record_end-position, ok, window[position:record_end] )
+        position = record_end
+
+
+def iter_record_views( marc_filepath, start=0, detected=None ):
+    """ Yields `( offset, length, ok, view )` as iter_raw_input() does, but with a RecordView (None for malformed records) in place of raw bytes.
+        Over a memory-map every view shares one memoryview of the map, so no record is copied; other input gets a view of each record's bytes.
+        Called by Extractor.extract_info_lazy() """
+    detected = detected or detect_input( marc_filepath )
+    if not can_memory_map( marc_filepath, detected ):
+        for ( offset, length, ok, raw ) in iter_raw_input( marc_filepath, start, detected ):
+            yield ( offset, length, ok, RecordView(raw) if ok else None )
+        return
+    with open_marc_buffer( marc_filepath ) as buf:
+        view = memoryview( buf )
+        try:
+            for ( offset, length, ok ) in walk_raw_records( buf, start=start ):
+                yield ( offset, length, ok, RecordView(buf, offset, length, view) if ok else None )
+        finally:
+            view.release()  # the memory-map can't close while a memoryview of it is live
+
+
+@contextlib.contextmanager
+def open_marc_buffer( marc_filepath ):
+    """ Yields a read-only memory-map of the marc file (or empty bytes for an empty file, which mmap refuses). """
+    with open( marc_filepath, 'rb' ) as fh:
+        if not os.fstat( fh.fileno() ).st_size:
+            yield b''
+            return
+        with mmap.mmap( fh.fileno(), 0, access=mmap.ACCESS_READ ) as buf:
+            yield buf
+
+
+def walk_raw_records( buf, start=0, end=None ):
+    """ Yields `( offset, length, ok )` for each record in buf, without decoding anything.
+        Trusts the 5-byte leader-length when it's numeric and lands on a record-terminator;
+          otherwise flags the record as malformed and resyncs to the next 0x1D.
+        Called by count_records_fast() """
+    end = len( buf ) if end is None else end
+    offset = start
+    while offset < end:
+        length_bytes = buf[offset:offset+5]
+        length = int( length_bytes ) if length_bytes.isdigit() else 0
+        record_end = offset + length
+        if length >= LEADER_LEN and record_end <= end and buf[record_end-1:record_end] == RECORD_TERMINATOR:
+            yield ( offset, length, True )
+        else:
+            record_end = find_resync_position( buf, offset, end )
+            yield ( offset, record_end-offset, False )
+        offset = record_end
+
+
+def find_resync_position( buf, offset, end ):
+    """ Returns where the next record starts after a malformed one at offset.
+        That's the first plausible leader -- length & base-address digits, no delimiters, a length landing on a 0x1D -- up to just past
+          the next terminator; so a truncated record doesn't swallow the good record behind it. Failing that, just past the terminator.
+        Called by walk_raw_records() and walk_raw_stream() """
+    terminator_position = buf.find( RECORD_TERMINATOR, offset, end )
+    resync_position = end if terminator_position == -1 else terminator_position + 1
+    match = LEADER_PATTERN.search( buf, offset+1, resync_position )
+    while match:
+        candidate = match.start()
+        record_end = candidate + int( buf[candidate:candidate+5] )
+        if record_end - candidate >= LEADER_LEN and record_end <= end and buf[record_end-1:record_end] == RECORD_TERMINATOR:
+            return candidate
+        match = LEADER_PATTERN.search( buf, candidate+1, resync_position )
+    return resync_position
+
+
+def iter_raw_records( fh ):
+    """ Yields raw records from a file-handle exactly as pymarc.MARCReader reads them -- trusting the leader-length -- but without decoding.
+        Called by Extractor.extract_info() and extract_shard() """
+    while True:
+        first5 = fh.read( 5 )
+        if not first5:
+            return
+        if len( first5 ) < 5:
+            raise pymarc.exceptions.RecordLengthInvalid
+        yield first5 + fh.read( int(first5) - 5 )
+
+
+def read_directory_fields( raw, wanted_tags ):
+    """ Yields `( tag, data )` for each directory entry of a raw record whose tag is in wanted_tags (or every entry, if wanted_tags is None).
+        Only the directory is parsed; field data is sliced (minus its field-terminator) but not decoded.
+        Called by Extractor.extract_raw_record() """
+    base_address = int( raw[12:17] )
+    for entry_start in range( LEADER_LEN, base_address - 1, DIRECTORY_ENTRY_LEN ):
+        tag = raw[entry_start:entry_start+3]
+        if wanted_tags is None or tag in wanted_tags:
+            field_length = int( raw[entry_start+3:entry_start+7] )
+            field_start = base_address + int( raw[entry_start+7:entry_start+12] )
+            yield ( tag, raw[field_start:field_start+field_length-1] )
+
+
+def extract_raw_bib_id( raw ):
+    """ Returns the 907$a[0:9] bib_id of a raw record -- the last usable 907 wins, as in extract_bib() -- or None.
+        Called by diff_snapshots() """
+    bib_id = None
+    for ( tag, data ) in read_directory_fields( raw, (b'907',) ):
+        subfields = split_subfields( data )
+        if subfields and subfields[0][0] == 'a':
+            bib_id = subfields[0][1][0:9]
+    return bib_id
+
+
+def extract_raw_ids( raw ):
+    """ Returns `( bib_id, [item_id, ...] )` for a raw record: the 907$a[0:9] bib_id (or None) and every 945$y, in order.
+        Called by RecordIdIndex.build() """
+    bib_id = None; item_ids = []
+    for ( tag, data ) in read_directory_fields( raw, (b'907', b'945') ):
+        subfields = split_subfields( data )
+        if tag == b'907':
+            if subfields and subfields[0][0] == 'a':
+                bib_id = subfields[0][1][0:9]
+        else:
+            item_ids.extend( val for (code, val) in subfields if code == 'y' )
+    return ( bib_id, item_ids )
+
+
+def split_subfields( data, decode_value=None ):
+    """ Returns `[ (code, value), ... ]` for a raw data-field, decoding as MARCReader does with force_utf8 & utf8_handling='ignore'
+          -- or with decode_value(), e.g. a RecordDecoder's, when given.
+        Empty subfields are skipped, as pymarc does.
+        Called by Extractor.extract_raw_record() """
+    if decode_value:
+        return [ (chunk[0:1].decode('ascii'), decode_value(chunk[1:])) for chunk in data.split(SUBFIELD_DELIMITER)[1:] if chunk ]
+    return [ (chunk[0:1].decode('ascii'), chunk[1:].decode('utf-8', 'ignore')) for chunk in data.split(SUBFIELD_DELIMITER)[1:] if chunk ]
+
+
+def register_fallback_errors( fallback ):
+    """ Registers (once) & returns the name of a codecs error-handler that decodes just the bytes utf-8 rejected via the fallback encoding,
+          so `data.decode( 'utf-8', name )` keeps every valid utf-8 character of a mostly-good value.
+        Called by RecordDecoder() """
+    name = 'pymarc_exp_fallback_{}'.format( fallback )
+    try:
+        codecs.lookup_error( name )
+    except LookupError:
+        codecs.register_error( name, lambda err: (err.object[err.start:err.end].decode(fallback), err.end) )
+    return name
+
+
+def check_raw_record( raw, check_utf8=True ):
+    """ Returns an error-type string for a structurally-broken record, or None if it's sound.
+        Checks leader, base-address, directory entries & field bounds -- everything pymarc's decode_marc() trips over -- plus strict utf-8.
+        Called by validate_records() """
+    base_address_bytes = raw[12:17]
+    if not base_address_bytes.isdigit():
+        return 'bad_base_address'
+    base_address = int( base_address_bytes )
+    if base_address <= LEADER_LEN or base_address >= len( raw ) or raw[base_address-1:base_address] != FIELD_TERMINATOR:
+        return 'bad_base_address'
+    if ( base_address - 1 - LEADER_LEN ) % DIRECTORY_ENTRY_LEN:
+        return 'bad_directory'
+    if base_address - 1 == LEADER_LEN:
+        return 'no_fields'
+    entry_digits = DIRECTORY_ENTRY_PATTERN.findall( raw, LEADER_LEN, base_address - 1 )  # one regex pass over the whole directory
+    if len( entry_digits ) * DIRECTORY_ENTRY_LEN != base_address - 1 - LEADER_LEN:  # fixed-width matches only tile the directory if every entry matched
+        return 'bad_directory'
+    for digits in entry_digits:
+        field_end = base_address + int( digits[4:] ) + int( digits[:4] )
+        if field_end >= len( raw ) or raw[field_end-1] != FIELD_TERMINATOR[0]:
+            return 'bad_field_bounds'
+    if check_utf8:
+        try:
+            raw[base_address:].decode( 'utf-8' )
+        except UnicodeDecodeError:
+            return 'invalid_utf8'
+    return None
+
+
+def find_shard_boundaries( marc_filepath, shard_count ):
+    """ Splits the file into up to shard_count `( start, end )` byte ranges that each begin & end on a record boundary.
+        A boundary is found by jumping to the rough split point and scanning forward to the next 0x1D terminator.
+        Called by Extractor.extract_info_parallel() """
+    file_size = os.path.getsize( marc_filepath )
+    boundaries = [ 0 ]
+    with open( marc_filepath, 'rb' ) as fh:
+        for shard_number in range( 1, shard_count ):
+            position = max( file_size * shard_number // shard_count, boundaries[-1] )
+            fh.seek( position )
+            while True:
+                chunk = fh.read( 65536 )
+                if not chunk:
+                    position = file_size
+                    break
+                terminator_position = chunk.find( RECORD_TERMINATOR )
+                if terminator_position != -1:
+                    position += terminator_position + 1
+                    break
+                position += len( chunk )
+            if boundaries[-1] < position < file_size:
+                boundaries.append( position )
+    boundaries.append( file_size )
+    return [ (boundaries[i], boundaries[i+1]) for i in range(len(boundaries)-1) if boundaries[i] < boundaries[i+1] ]
+
+
+def extract_shard( marc_filepath, start_offset, end_offset, lazy=False, filter_spec=None ):
+    """ Runs the Extractor's bib/item extraction over one record-aligned byte range; records failing filter_spec (a RecordFilter) are skipped.
+        Walks the range over a memory-map, as profile_shard() does, so the shard is never read into memory whole.
+        Returns `( [ (title, bib_id, item_id), ... ], worker_stats )`, rows in record order.
+        Called by Extractor.extract_info_parallel(), in a worker process. """
+    extractor = Extractor( marc_filepath, filter_spec )
+    rows = []
+    with open_marc_buffer( marc_filepath ) as buf:
+        if lazy:
+            with memoryview( buf ) as view:  # the memory-map can't close while a memoryview of it is live
+                for ( offset, length, ok ) in walk_raw_records( buf, start_offset, end_offset ):
+                    if not ok:
+                        extractor.skip_record( offset, 'bad_record_length' )
+                        continue
+                    record_view = RecordView( buf, offset, length, view )
+                    try:
+                        if extractor.record_filter and not extractor.passes_filter( record_view ):
+                            continue
+                        rows.append( extractor.extract_record_view(record_view) )
+                    except UNREADABLE_RECORD_ERRORS:
+                        if not extractor.skip_unreadable( offset, record_view.raw() ):
+                            raise
+            return ( rows, extractor.worker_stats() )
+        buf.seek( start_offset )
+        raw_records = iter_raw_records( buf )
+        while buf.tell() < end_offset:
+            chunk = next( raw_records, None )  # filters raw bytes, then decodes just the survivors -- reading exactly as MARCReader does
+            if chunk is None:
+                break
+            try:
+                if extractor.record_filter and not extractor.passes_filter( RecordView(chunk) ):
+                    continue
+                record = extractor.decode_raw( chunk )
+            except UNREADABLE_RECORD_ERRORS:
+                if not extractor.skip_unreadable( buf.tell()-len(chunk), chunk ):
+                    raise
+                continue
+            rows.append( extractor.extract_record(record) )
+    return ( rows, extractor.worker_stats() )
+
+
+def read_raw_batch( raw_records, batch_size, skip_record ):
+    """ Pulls up to batch_size well-formed raw records from an iter_raw_input() generator; returns `( [raw, ...], [offset, ...], end_offset )`,
+          or None when exhausted. Malformed records go to skip_record( offset, error_type ).
+        Called by Extractor.read_stage(), in a thread. """
+    raws = []; offsets = []; end_offset = 0
+    for ( offset, length, ok, raw ) in raw_records:
+        end_offset = offset + length
+        if not ok:
+            skip_record( offset, 'bad_record_length' )
+            continue
+        raws.append( raw )
+        offsets.append( offset )
+        if len( raws ) >= batch_size:
+            break
+    if not raws and not end_offset:
+        return None
+    return ( raws, offsets, end_offset )
+
+
+def extract_raw_batch( marc_filepath, raws, offsets, lazy=True, filter_spec=None ):
+    """ Runs the bib/item extraction over a batch of raw records (found at offsets); returns `( [ (title, bib_id, item_id), ... ], worker_stats )`,
+          rows in order. Records failing filter_spec (a RecordFilter), or too broken to read, are skipped.
+        Called by Extractor.parse_stage(), in a worker process. """
+    extractor = Extractor( marc_filepath, filter_spec )
+    rows = []
+    for ( offset, raw ) in zip( offsets, raws ):
+        try:
+            if extractor.record_filter and not extractor.passes_filter( RecordView(raw) ):
+                continue
+            row = extractor.extract_raw_record( raw ) if lazy else extractor.extract_record( extractor.decode_raw(raw) )
+        except UNREADABLE_RECORD_ERRORS:
+            if not extractor.skip_unreadable( offset, raw ):
+                raise
+            continue
+        rows.append( row )
+    return ( rows, extractor.worker_stats() )
+
+
+def count_records_fast( marc_filepath=None ):
+    """ Counts records by walking leader-lengths over a memory-mapped file (or a decompressed stream).
+        Nothing is decoded, so this is many times faster than count_records(); it also reports malformed-length records.
+        """
+    marc_filepath = marc_filepath or settings.INPUT_FILEPATH
+    log.debug( 'processing file, ``{}```'.format(marc_filepath) )
+    start = datetime.datetime.now()
+    count = 0; total_bytes = 0; malformed = []; malformed_count = 0
+    for ( offset, length, ok, raw ) in iter_raw_input( marc_filepath ):
+        total_bytes += length
+        if ok:
+            count += 1
+        else:
+            malformed_count += 1
+            if len( malformed ) < settings.MALFORMED_REPORT_LIMIT:  # a badly broken file can't grow the result without bound
+                malformed.append( {'offset': offset, 'length': length} )
+            log.warning( 'malformed record-length at offset, `{off}`; resynced after `{len}` bytes'.format( off=offset, len=length ) )
+    result = { 'count': count, 'total_bytes': total_bytes, 'malformed_count': malformed_count, 'malformed': malformed }
+    log.debug( 'count of records in file, `{cnt}`; malformed, `{bad}`; time_taken, `{time}`'.format( cnt=count, bad=malformed_count, time=datetime.datetime.now()-start ) )
+    return result
+
+
+def validate_records( marc_filepath=None, quarantine_filepath=None, report_filepath=None, check_utf8=True ):
+    """ Streams once over the whole file, checking every record.
+        Malformed-length records are resynced on the next 0x1D terminator; every bad record's raw bytes are copied to the quarantine file,
+          and a compact json report of `[offset, length, error_type]` entries is written alongside.
+        Replaces the open-ended hunting of count_records_and_log_bad_record(). """
+    marc_filepath = marc_filepath or settings.INPUT_FILEPATH
+    quarantine_filepath = quarantine_filepath or '{}.quarantine.mrc'.format( marc_filepath )
+    report_filepath = report_filepath or '{}.validation.json'.format( marc_filepath )
+    log.debug( 'processing file, ``{fp}``; quarantine, ``{qf}``'.format( fp=marc_filepath, qf=quarantine_filepath ) )
+    start = datetime.datetime.now()
+    count_good = 0; problems = []; error_counts = {}
+    with open( quarantine_filepath, 'wb' ) as quarantine_fh:
+        for ( offset, length, ok, raw ) in iter_raw_input( marc_filepath ):  # compressed input is validated in decompressed positions
+            error_type = check_raw_record( raw, check_utf8 ) if ok else 'bad_record_length'
+            if error_type is None:
+                count_good += 1
+                continue
+            quarantine_fh.write( raw )
+            problems.append( [offset, length, error_type] )
+            error_counts[error_type] = error_counts.get( error_type, 0 ) + 1
+            log.debug( 'bad record; offset, `{off}`; length, `{len}`; error, `{err}`'.format( off=offset, len=length, err=error_type ) )
+    report = {
+        'marc_filepath': marc_filepath, 'quarantine_filepath': quarantine_filepath,
+        'count_good': count_good, 'count_bad': len(problems), 'error_counts': error_counts,
+        'time_taken': str( datetime.datetime.now()-start ),
+        'problems': problems }
+    with open( report_filepath, 'w' ) as fh:
+        json.dump( report, fh, separators=(',', ':') )
+    log.info( 'count_good, `{good}`; count_bad, `{bad}`; error_counts, `{errs}`; time_taken, `{time}`'.format(
+        good=count_good, bad=len(problems), errs=error_counts, time=report['time_taken'] ) )
+    return report
+
+
+def profile_raw_records( raw_records ):
+    """ Tallies `( buf, offset, length, ok )` records from their leaders & directories alone -- no field data is read.
+        Returns a partial profile that merge_profiles() can combine with others.
+        Called by profile_shard() and profile_records() """
+    profile = { 'records': 0, 'bytes': 0, 'malformed': 0, 'bad_directory': 0,
+                'records_with_tag': {}, 'tag_occurrences': {}, 'items_per_record': {}, 'size_histogram': {}, 'leader_09': {} }
+    ( records_with_tag, tag_occurrences ) = ( profile['records_with_tag'], profile['tag_occurrences'] )
+    for ( buf, offset, length, ok ) in raw_records:
+        profile['bytes'] += length
+        if not ok:
+            profile['malformed'] += 1
+            continue
+        profile['records'] += 1
+        size_bucket = str( 1 << max(length-1, 1).bit_length() )  # upper bound of the record's power-of-two size bucket
+        profile['size_histogram'][size_bucket] = profile['size_histogram'].get( size_bucket, 0 ) + 1
+        encoding = buf[offset+9:offset+10].decode( 'ascii', 'replace' )
+        profile['leader_09'][encoding] = profile['leader_09'].get( encoding, 0 ) + 1
+        base_address_bytes = buf[offset+12:offset+17]
+        if not base_address_bytes.isdigit() or int( base_address_bytes ) > length:
+            profile['bad_directory'] += 1
+            continue
+        tags = [ buf[entry_start:entry_start+3] for entry_start in range(offset+LEADER_LEN, offset+int(base_address_bytes)-1, DIRECTORY_ENTRY_LEN) ]
+        for tag in tags:
+            tag_occurrences[tag] = tag_occurrences.get( tag, 0 ) + 1
+        for tag in set( tags ):
+            records_with_tag[tag] = records_with_tag.get( tag, 0 ) + 1
+        item_count = str( tags.count(b'945') )
+        profile['items_per_record'][item_count] = profile['items_per_record'].get( item_count, 0 ) + 1
+    for key in ( 'records_with_tag', 'tag_occurrences' ):
+        profile[key] = { tag.decode('ascii', 'replace'): count for (tag, count) in profile[key].items() }
+    return profile
+
+
+def profile_shard( marc_filepath, start_offset, end_offset ):
+    """ Profiles one record-aligned byte range of a plain marc file.
+        Called by profile_records(), in a worker process. """
+    with open_marc_buffer( marc_filepath ) as buf:
+        return profile_raw_records( (buf, offset, length, ok) for (offset, length, ok) in walk_raw_records(buf, start_offset, end_offset) )
+
+
+def merge_profiles( profiles ):
+    """ Sums partial profiles; counters add, and their dict-tallies add key by key.
+        Called by profile_records() """
+    merged = {}
+    for profile in profiles:
+        for ( key, value ) in profile.items():
+            if isinstance( value, dict ):
+                tally = merged.setdefault( key, {} )
+                for ( sub_key, count ) in value.items():
+                    tally[sub_key] = tally.get( sub_key, 0 ) + count
+            else:
+                merged[key] = merged.get( key, 0 ) + value
+    return merged
+
+
+def profile_records( marc_filepath=None, report_filepath=None, workers=None ):
+    """ One-pass profile of a marc file from leaders & directories alone: tag frequencies (records carrying each tag, and total
+          occurrences), the distribution of 945 items per record, a power-of-two record-size histogram, and leader/09 encodings.
+        Plain files are profiled in shards across a process pool; compressed & structured input in one streaming pass.
+        Writes a json report (default `<input>.profile.json`) & returns it.
+        Replaces one-off loops like count_records_and_log_bad_record(). """
+    marc_filepath = marc_filepath or settings.INPUT_FILEPATH
+    report_filepath = report_filepath or '{}.profile.json'.format( marc_filepath )
+    log.debug( 'processing file, ``{}```'.format(marc_filepath) )
+    start = datetime.datetime.now()
+    detected = detect_input( marc_filepath )
+    if can_memory_map( marc_filepath, detected ):
+        workers = workers or os.cpu_count()
+        shards = find_shard_boundaries( marc_filepath, workers * 4 )
+        with concurrent.futures.ProcessPoolExecutor( max_workers=workers ) as executor:
+            profile = merge_profiles( executor.map(profile_shard, [marc_filepath]*len(shards), [shard[0] for shard in shards], [shard[1] for shard in shards]) )
+    else:
+        profile = profile_raw_records( (raw, 0, length, ok) for (offset, length, ok, raw) in iter_raw_input(marc_filepath, detected=detected) )
+    profile = merge_profiles( [profile_raw_records([]), profile] )  # an empty file still reports every key
+    records = profile['records']
+    report = {
+        'marc_filepath': marc_filepath, 'records': records, 'bytes': profile['bytes'],
+        'malformed': profile['malformed'], 'bad_directory': profile['bad_directory'],
+        'records_with_907': profile['records_with_tag'].get( '907', 0 ),
+        'records_with_945': profile['records_with_tag'].get( '945', 0 ),
+        'non_utf8_leader_09': records - profile['leader_09'].get( 'a', 0 ),
+        'leader_09': profile['leader_09'],
+        'items_per_record': { key: profile['items_per_record'][key] for key in sorted(profile['items_per_record'], key=int) },
+        'size_histogram': { key: profile['size_histogram'][key] for key in sorted(profile['size_histogram'], key=int) },
+        'records_with_tag': dict( sorted(profile['records_with_tag'].items()) ),
+        'tag_occurrences': dict( sorted(profile['tag_occurrences'].items()) ),
+        'time_taken': str( datetime.datetime.now()-start ) }
+    with open( report_filepath, 'w' ) as fh:
+        json.dump( report, fh, indent=2 )
+    log.info( 'records, `{rec}`; report, ``{rpt}``; time_taken, `{time}`'.format( rec=records, rpt=report_filepath, time=report['time_taken'] ) )
+    return report
+
+
+DIFF_ENTRY = struct.Struct( '<H16sQ' )  # bib_id byte-length, blake2b fingerprint of the raw record, byte offset; the utf-8 bib_id follows
+
+
+def spill_fingerprints( marc_filepath, temp_dir, prefix, partitions ):
+    """ Walks a marc file, writing a length-prefixed (bib_id, fingerprint, offset) entry per record into one of `partitions` spill files,
+          chosen by a hash of the bib_id, so each partition can later be diffed in memory on its own.
+        bib_ids are stored whole -- a 9-character id can be more than 9 utf-8 bytes -- so distinct ids never collide.
+        Returns the count of records lacking a bib_id (which can't be diffed).
+        Called by diff_snapshots() """
+    spill_fhs = [ open(os.path.join(temp_dir, '{pre}_{num:03d}.bin'.format(pre=prefix, num=num)), 'wb') for num in range(partitions) ]
+    count_no_bib = 0
+    try:
+        with open_marc_buffer( marc_filepath ) as buf:
+            for ( offset, length, ok ) in walk_raw_records( buf ):
+                if not ok:
+                    continue
+                raw = buf[offset:offset+length]
+                bib_id = extract_raw_bib_id( raw )
+                if not bib_id:
+                    count_no_bib += 1
+                    continue
+                bib_bytes = bib_id.encode( 'utf-8' )
+                digest = hashlib.blake2b( raw, digest_size=16 ).digest()
+                spill_fhs[ zlib.crc32(bib_bytes) % partitions ].write( DIFF_ENTRY.pack(len(bib_bytes), digest, offset) + bib_bytes )
+    finally:
+        for fh in spill_fhs:
+            fh.close()
+    return count_no_bib
+
+
+def read_spill( spill_filepath ):
+    """ Yields (bib_id, fingerprint, offset) entries from a spill file.
+        Called by diff_snapshots() """
+    with open( spill_filepath, 'rb' ) as fh:
+        data = fh.read()
+    position = 0
+    while position < len( data ):
+        ( bib_length, digest, offset ) = DIFF_ENTRY.unpack_from( data, position )
+        position += DIFF_ENTRY.size
+        yield ( data[position:position+bib_length].decode('utf-8'), digest, offset )
+        position += bib_length
+
+
+def diff_snapshots( old_filepath, new_filepath, output_dir, changed_marc_filepath=None, partitions=64 ):
+    """ Compares two exports keyed on 907 bib_id, fingerprinting each record's raw bytes.
+        Writes `added.txt`, `removed.txt` & `changed.txt` id-lists to output_dir and, optionally, a marc file of the added & changed records
+          copied byte-for-byte from the new file.
+        Memory is bounded by hash-partitioning both files to disk first, then diffing one partition at a time. """
+    log.debug( 'old, ``{old}``; new, ``{new}``'.format( old=old_filepath, new=new_filepath ) )
+    start = datetime.datetime.now()
+    os.makedirs( output_dir, exist_ok=True )
+    counts = { 'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0 }
+    changed_offsets = array.array( 'Q' )
+    with tempfile.TemporaryDirectory( dir=output_dir ) as temp_dir:
+        no_bib = { 'old': spill_fingerprints( old_filepath, temp_dir, 'old', partitions ),
+                   'new': spill_fingerprints( new_filepath, temp_dir, 'new', partitions ) }
+        list_fhs = { key: open(os.path.join(output_dir, '{}.txt'.format(key)), 'w') for key in ('added', 'removed', 'changed') }
+        try:
+            for num in range( partitions ):
+                old_entries = { bib_id: digest for (bib_id, digest, offset) in read_spill(os.path.join(temp_dir, 'old_{:03d}.bin'.format(num))) }
+                seen = set()
+                for ( bib_id, digest, offset ) in read_spill( os.path.join(temp_dir, 'new_{:03d}.bin'.format(num)) ):
+                    seen.add( bib_id )
+                    old_digest = old_entries.get( bib_id )
+                    if old_digest == digest:
+                        counts['unchanged'] += 1
+                        continue
+                    key = 'added' if old_digest is None else 'changed'
+                    counts[key] += 1
+                    list_fhs[key].write( bib_id + '\n' )
+                    changed_offsets.append( offset )
+                for bib_id in sorted( set(old_entries) - seen ):
+                    counts['removed'] += 1
+                    list_fhs['removed'].write( bib_id + '\n' )
+        finally:
+            for fh in list_fhs.values():
+                fh.close()
+    if changed_marc_filepath:
+        changed_offsets = array.array( 'Q', sorted(changed_offsets) )  # copy in file order
+        with open_marc_buffer( new_filepath ) as buf, open( changed_marc_filepath, 'wb' ) as output_fh:
+            for offset in changed_offsets:
+                output_fh.write( buf[offset:offset+int(buf[offset:offset+5])] )
+    result = dict( counts, records_without_bib_id=no_bib, time_taken=str(datetime.datetime.now()-start) )
+    log.info( 'diff result, ```{}```'.format(result) )
+    return result
+
+
+class BloomFilter( object ):
+    """ Fixed-size bloom-filter over a bytearray; never a false negative, false positives at a rate set by its size & contents.
+        Bit positions come from one blake2b digest by double hashing. """
+
+    HASH_COUNT = 7
+
+    def __init__( self, size_bytes ):
+        self.bit_count = max( 8, size_bytes * 8 )
+        self.bits = bytearray( self.bit_count // 8 )
+
+    def positions( self, key ):
+        digest = hashlib.blake2b( key, digest_size=16 ).digest()
+        ( first, second ) = ( int.from_bytes(digest[0:8], 'little'), int.from_bytes(digest[8:16], 'little') | 1 )
+        return [ (first + number*second) % self.bit_count for number in range(self.HASH_COUNT) ]
+
+    def add( self, key, positions=None ):
+        """ Adds key; returns True if it was (probably) already there. """
+        bits = self.bits; present = True
+        for position in positions or self.positions( key ):
+            mask = 1 << ( position & 7 )
+            if not bits[position >> 3] & mask:
+                present = False
+                bits[position >> 3] |= mask
+        return present
+
+    def __contains__( self, key ):
+        return all( self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key) )
+
+    ## end class BloomFilter()
+
+
+def iter_record_ids( marc_filepaths ):
+    """ Yields `( key, file_number, offset )` for each distinct id of each record across marc_filepaths;
+          key is `b'b' + bib_id` or `b'i' + item_id`, so a bib_id & an item_id never collide.
+        Called by find_duplicates() """
+    for ( file_number, marc_filepath ) in enumerate( marc_filepaths ):
+        for ( offset, length, ok, raw ) in iter_raw_input( marc_filepath ):
+            if not ok:
+                continue
+            ( bib_id, item_ids ) = extract_raw_ids( raw )
+            keys = set( b'i' + item_id.encode('utf-8') for item_id in item_ids )  # the same barcode twice in one record isn't a duplicate record
+            if bib_id:
+                keys.add( b'b' + bib_id.encode('utf-8') )
+            for key in keys:
+                yield ( key, file_number, offset )
+
+
+def find_duplicates( marc_filepaths, output_dir, memory_mb=None ):
+    """ Finds every 907 bib_id & 945$y item_id carried by more than one record, across one or more exports, in bounded memory.
+        Pass 1 runs every id through a `seen` bloom-filter; ids it has probably seen go into a `repeated` filter.
+        Pass 2 spills each occurrence of a `repeated` id to hash-partitioned files, and each partition is then confirmed exactly in memory,
+          dropping the bloom-filters' false positives.
+        Writes `duplicates.jsonl` -- `{"kind", "id", "records": [[marc_filepath, offset], ...]}` per duplicated id -- to output_dir.
+        Offsets into compressed input are decompressed positions. """
+    marc_filepaths = list( marc_filepaths )
+    memory_bytes = ( memory_mb or settings.DUPLICATE_MEMORY_MB ) * 1024 * 1024
+    log.debug( 'files, ```{fps}```; memory_bytes, `{mem}`'.format( fps=marc_filepaths, mem=memory_bytes ) )
+    start = datetime.datetime.now()
+    os.makedirs( output_dir, exist_ok=True )
+    ( seen, repeated ) = ( BloomFilter(memory_bytes // 4), BloomFilter(memory_bytes // 4) )
+    count_ids = 0; count_repeats = 0
+    for ( key, file_number, offset ) in iter_record_ids( marc_filepaths ):
+        count_ids += 1
+        positions = seen.positions( key )
+        if seen.add( key, positions ):
+            count_repeats += 1
+            repeated.add( key, positions )  # same size & hashes, so the positions carry over
+    partitions = max( 1, -(-count_repeats * 2 * 200 // (memory_bytes // 2)) )  # ~200 bytes per in-memory occurrence; first occurrences double the repeats
+    counts = { 'bib': 0, 'item': 0 }; count_candidates = 0; count_false_positives = 0
+    with tempfile.TemporaryDirectory( dir=output_dir ) as temp_dir:
+        spill_fhs = [ open(os.path.join(temp_dir, 'dup_{:03d}.txt'.format(num)), 'wb') for num in range(partitions) ]
+        try:
+            for ( key, file_number, offset ) in iter_record_ids( marc_filepaths ):
+                if key in repeated:
+                    spill_fhs[ zlib.crc32(key) % partitions ].write( b'%d\t%d\t%s\n' % (file_number, offset, key) )
+        finally:
+            for fh in spill_fhs:
+                fh.close()
+        with open( os.path.join(output_dir, 'duplicates.jsonl'), 'w', encoding='utf-8' ) as report_fh:
+            for num in range( partitions ):
+                occurrences = {}
+                with open( os.path.join(temp_dir, 'dup_{:03d}.txt'.format(num)), 'rb' ) as fh:
+                    for line in fh:
+                        ( file_number, offset, key ) = line.rstrip( b'\n' ).split( b'\t', 2 )
+                        occurrences.setdefault( key, [] ).append( [marc_filepaths[int(file_number)], int(offset)] )
+                for ( key, records ) in sorted( occurrences.items() ):
+                    count_candidates += 1
+                    if len( records ) < 2:
+                        count_false_positives += 1
+                        continue
+                    kind = 'bib' if key[0:1] == b'b' else 'item'
+                    counts[kind] += 1
+                    report_fh.write( json.dumps({'kind': kind, 'id': key[1:].decode('utf-8'), 'records': records}, ensure_ascii=False) + '\n' )
+    result = {
+        'ids_checked': count_ids, 'duplicated_bib_ids': counts['bib'], 'duplicated_item_ids': counts['item'],
+        'candidates': count_candidates, 'false_positives': count_false_positives, 'partitions': partitions,
+        'report_filepath': os.path.join( output_dir, 'duplicates.jsonl' ), 'time_taken': str(datetime.datetime.now()-start) }
+    log.info( 'duplicates result, ```{}```'.format(result) )
+    return result
+
+
+def split_records( output_dir, mode='count', records_per_file=100000, bytes_per_file=100*1024*1024, partitions=16, marc_filepath=None, filter_spec=None ):
+    """ Splits a big marc file into many smaller files in one pass, copying original record bytes straight through (no decode/re-encode).
+        mode is one of:
+          'count' -- a new file every records_per_file records
+          'bytes' -- a new file before a record would push the current one past bytes_per_file
+          'bib_hash' -- `partitions` files, each record routed by a hash of its 907 bib_id; records without one go to a `_no_bib_id` file
+        Unlike break_up_record(), nothing is dropped except malformed-length records, which are counted (see validate_records()),
+          and -- given a filter_spec -- records failing that RecordFilter, which are dropped before anything else looks at them. """
+    marc_filepath = marc_filepath or settings.INPUT_FILEPATH
+    log.debug( 'processing file, ``{fp}``; mode, `{md}`'.format( fp=marc_filepath, md=mode ) )
+    start = datetime.datetime.now()
+    os.makedirs( output_dir, exist_ok=True )
+    name_template = os.path.join( output_dir, os.path.splitext(os.path.basename(marc_filepath))[0] + '_{}.mrc' )
+    output_fhs = {}; record_counts = {}; byte_counts = {}
+    count_malformed = 0; count_filtered_out = 0
+    current_part = 0
+    record_filter = RecordFilter( filter_spec ) if filter_spec else None
+    try:
+        with open_marc_buffer( marc_filepath ) as buf, memoryview( buf ) as view:
+            for ( offset, length, ok ) in walk_raw_records( buf ):
+                if not ok:
+                    count_malformed += 1
+                    continue
+                if record_filter and not record_filter.matches( RecordView(buf, offset, length, view) ):
+                    count_filtered_out += 1
+                    continue
+                raw = buf[offset:offset+length]
+                if mode == 'count':
+                    if record_counts.get( current_part, 0 ) >= records_per_file:
+                        current_part += 1
+                    part = current_part
+                elif mode == 'bytes':
+                    if byte_counts.get( current_part, 0 ) and byte_counts[current_part] + length > bytes_per_file:
+                        current_part += 1
+                    part = current_part
+                elif mode == 'bib_hash':
+                    bib_id = extract_raw_bib_id( raw )
+                    part = zlib.crc32( bib_id.encode('utf-8') ) % partitions if bib_id else 'no_bib_id'
+                else:
+                    raise ValueError( 'unknown split mode, `{}`'.format(mode) )
+                if part not in output_fhs:
+                    if mode != 'bib_hash' and current_part:
+                        output_fhs[current_part-1].close()  # sequential modes never revisit a finished file
+                    output_fhs[part] = open( name_template.format(part if part == 'no_bib_id' else '{:04d}'.format(part)), 'wb' )
+                output_fhs[part].write( raw )
+                record_counts[part] = record_counts.get( part, 0 ) + 1
+                byte_counts[part] = byte_counts.get( part, 0 ) + length
+    finally:
+        for fh in output_fhs.values():
+            fh.close()
+    result = {
+        'files': { os.path.basename(fh.name): {'records': record_counts[part], 'bytes': byte_counts[part]} for (part, fh) in output_fhs.items() },
+        'count_malformed': count_malformed, 'count_filtered_out': count_filtered_out, 'time_taken': str(datetime.datetime.now()-start) }
+    log.info( 'files written, `{cnt}`; count_malformed, `{bad}`; time_taken, `{time}`'.format( cnt=len(output_fhs), bad=count_malformed, time=result['time_taken'] ) )
+    return result
+
+
+def load_sqlite( db_filepath, marc_filepath=None, spec=None ):
+    """ Extracts title, bib_id & every 945$y item_id (settings.SQLITE_SELECTORS) into the normalized bibs/items tables of a SqliteSink.
+        Example query: `SELECT bibs.bib_id, bibs.title FROM items JOIN bibs USING ( record_id ) WHERE items.item_id = ?` """
+    extractor = Extractor( marc_filepath )
+    extractor.sink_filepath = db_filepath
+    extractor.sink_format = 'sqlite'
+    extractor.extract_info_selected( spec or settings.SQLITE_SELECTORS )
+    return { 'db_filepath': db_filepath, 'records': extractor.count, 'stages': extractor.timer.summary() }
+
+
+BATCH_JOBS = ( 'count', 'validate', 'extract' )
+BATCH_PATTERNS = ( '*.mrc', '*.mrc.gz', '*.mrc.bz2', '*.mrc.xz' )
+SINK_EXTENSIONS = { 'jsonl': '.jsonl', 'csv': '.csv', 'columnar': '.col', 'sqlite': '.sqlite' }
+
+
+def find_batch_files( source ):
+    """ Returns the marc files for a batch -- the BATCH_PATTERNS files in a directory, or the matches of a glob -- largest first.
+        Called by process_batch() """
+    if os.path.isdir( source ):
+        filepaths = set( filepath for pattern in BATCH_PATTERNS for filepath in glob.glob(os.path.join(source, pattern)) )
+    else:
+        filepaths = set( glob.glob(source) )
+    return sorted( [filepath for filepath in filepaths if os.path.isfile(filepath)], key=lambda filepath: (-os.path.getsize(filepath), filepath) )
+
+
+def run_batch_file( job, marc_filepath, output_dir ):
+    """ Runs one batch job on one file; returns a summary with `records`, `bad_records`, `error_counts` & `seconds`, or an `error`.
+        Called by process_batch(), in a worker process. """
+    start = time.perf_counter()
+    summary = { 'marc_filepath': marc_filepath, 'bytes': os.path.getsize(marc_filepath) }
+    base_name = os.path.basename( marc_filepath )
+    try:
+        if job == 'count':
+            result = count_records_fast( marc_filepath )
+            summary.update( {'records': result['count'], 'bad_records': result['malformed_count'],
+                             'error_counts': {'bad_record_length': result['malformed_count']} if result['malformed_count'] else {}} )
+        elif job == 'validate':
+            result = validate_records( marc_filepath, os.path.join(output_dir, base_name+'.quarantine.mrc'), os.path.join(output_dir, base_name+'.validation.json') )
+            summary.update( {'records': result['count_good'], 'bad_records': result['count_bad'], 'error_counts': result['error_counts']} )
+        elif job == 'extract':
+            extractor = Extractor( marc_filepath )
+            extractor.sink_filepath = os.path.join( output_dir, base_name + SINK_EXTENSIONS[settings.SINK_FORMAT] )
+            extractor.checkpoint_filepath = os.path.join( output_dir, base_name+'.checkpoint.json' )
+            extractor.extract_info_lazy()
+            summary.update( {'records': extractor.count, 'bad_records': sum( extractor.error_counts.values() ), 'error_counts': extractor.error_counts,
+                             'sink_filepath': extractor.sink_filepath} )
+        else:
+            raise ValueError( 'unknown batch job, `{}`'.format(job) )
+    except Exception as e:
+        log.exception( 'batch job `{job}` failed on ``{fp}``'.format( job=job, fp=marc_filepath ) )
+        summary['error'] = repr( e )
+    summary['seconds'] = round( time.perf_counter()-start, 3 )
+    return summary
+
+
+def process_batch( source, job='count', workers=None, output_dir=None ):
+    """ Runs a job ('count', 'validate' or 'extract') over every marc file of a directory or glob, concurrently across a process pool.
+        Files are submitted largest-first, so one big file doesn't start last and hold up the whole batch.
+        Returns per-file summaries plus aggregate counts, timings & errors; one failing file doesn't stop the rest. """
+    if job not in BATCH_JOBS:
+        raise ValueError( 'unknown batch job, `{}`'.format(job) )
+    start = time.perf_counter()
+    filepaths = find_batch_files( source )
+    output_dir = output_dir or os.path.join( source if os.path.isdir(source) else os.path.dirname(source) or '.', 'batch_output' )
+    os.makedirs( output_dir, exist_ok=True )
+    log.debug( 'batch job, `{job}`; files, `{cnt}`; output_dir, ``{od}``'.format( job=job, cnt=len(filepaths), od=output_dir ) )
+    summaries = {}
+    with concurrent.futures.ProcessPoolExecutor( max_workers=workers or os.cpu_count() ) as executor:
+        futures = { executor.submit(run_batch_file, job, filepath, output_dir): filepath for filepath in filepaths }
+        for future in concurrent.futures.as_completed( futures ):
+            summary = future.result()
+            summaries[futures[future]] = summary
+            print( '`{fp}` -- `{rec}` records; `{sec}`s{err}'.format(
+                fp=os.path.basename(summary['marc_filepath']), rec=summary.get('records'), sec=summary['seconds'],
+                err='; error, `{}`'.format(summary['error']) if 'error' in summary else '' ) )
+    files = [ summaries[filepath] for filepath in filepaths ]
+    error_counts = {}
+    for summary in files:
+        for ( error_type, count ) in summary.get( 'error_counts', {} ).items():
+            error_counts[error_type] = error_counts.get( error_type, 0 ) + count
+    aggregate = {
+        'job': job, 'files': len(files), 'files_failed': sum( 1 for summary in files if 'error' in summary ),
+        'bytes': sum( summary['bytes'] for summary in files ),
+        'records': sum( summary.get('records', 0) for summary in files ),
+        'bad_records': sum( summary.get('bad_records', 0) for summary in files ),
+        'error_counts': error_counts,
+        'failures': { summary['marc_filepath']: summary['error'] for summary in files if 'error' in summary },
+        'seconds': round( time.perf_counter()-start, 3 ),
+        'file_seconds': round( sum(summary['seconds'] for summary in files), 3 ) }  # vs `seconds`, shows what the pool saved
+    log.info( 'batch summary, ```{}```'.format( pprint.pformat(aggregate) ) )
+    return { 'aggregate': aggregate, 'files': files }
+
+
+########################
+## command-line entry ##
+########################
+
+
+def build_arg_parser():
+    """ Builds the command-line parser; each sub-command maps to one of the functions above.
+        Called by main() """
+    parser = argparse.ArgumentParser( description='pymarc experimentation commands' )
+    subparsers = parser.add_subparsers( dest='command' )
+    count_parser = subparsers.add_parser( 'count_fast', help='count records from leaders only, without decoding' )
+    count_parser.add_argument( '--input', default=None, help='marc file; defaults to settings.INPUT_FILEPATH' )
+    index_parser = subparsers.add_parser( 'build_index', help='write the sidecar (offset, length) index' )
+    index_parser.add_argument( '--input', default=None, help='marc file; defaults to settings.INPUT_FILEPATH' )
+    range_parser = subparsers.add_parser( 'break_up_indexed', help='copy a 1-based inclusive record range to settings.OUTPUT_FILEPATH' )
+    range_parser.add_argument( 'start_record', type=int )
+    range_parser.add_argument( 'end_record', type=int )
+    validate_parser = subparsers.add_parser( 'validate', help='check every record in one pass; quarantine the bad ones' )
+    validate_parser.add_argument( '--input', default=None, help='marc file; defaults to settings.INPUT_FILEPATH' )
+    validate_parser.add_argument( '--quarantine', default=None, help='defaults to `<input>.quarantine.mrc`' )
+    validate_parser.add_argument( '--report', default=None, help='defaults to `<input>.validation.json`' )
+    validate_parser.add_argument( '--skip-utf8', action='store_true', help='skip the strict utf-8 check' )
+    diff_parser = subparsers.add_parser( 'diff', help='compare two exports by 907 bib_id' )
+    diff_parser.add_argument( 'old_filepath' )
+    diff_parser.add_argument( 'new_filepath' )
+    diff_parser.add_argument( '--output-dir', required=True, help='where added/removed/changed id-lists are written' )
+    diff_parser.add_argument( '--changed-marc', default=None, help='optional marc file of added & changed records from the new file' )
+    diff_parser.add_argument( '--partitions', type=int, default=64, help='more partitions means less memory per partition' )
+    id_index_parser = subparsers.add_parser( 'build_id_index', help='write the sqlite bib_id/item_id lookup-index' )
+    id_index_parser.add_argument( '--input', default=None, help='marc file; defaults to settings.INPUT_FILEPATH' )
+    lookup_parser = subparsers.add_parser( 'lookup', help='print the record(s) for a bib_id or item_id' )
+    lookup_parser.add_argument( 'record_id', help='e.g. `.b12345678`, or a 945$y item_id' )
+    lookup_parser.add_argument( '--input', default=None, help='marc file; defaults to settings.INPUT_FILEPATH' )
+    lookup_parser.add_argument( '--raw', action='store_true', help='write raw marc to stdout instead of json' )
+    split_parser = subparsers.add_parser( 'split', help='split into many files in one pass, copying raw record bytes' )
+    split_parser.add_argument( 'output_dir' )
+    split_parser.add_argument( '--input', default=None, help='marc file; defaults to settings.INPUT_FILEPATH' )
+    split_parser.add_argument( '--mode', choices=['count', 'bytes', 'bib_hash'], default='count' )
+    split_parser.add_argument( '--records-per-file', type=int, default=100000 )
+    split_parser.add_argument( '--bytes-per-file', type=int, default=100*1024*1024 )
+    split_parser.add_argument( '--partitions', type=int, default=16 )
+    split_parser.add_argument( '--filter', default=None, metavar='SPEC', help='keep only records passing a RecordFilter spec, e.g. `945l=loc3;856`' )
+    extract_parser = subparsers.add_parser( 'extract', help='run Extractor.extract_info(), optionally across a process pool' )
+    extract_parser.add_argument( '--workers', type=int, default=1, help='worker processes; 1 runs the serial path, 0 uses every cpu' )
+    extract_parser.add_argument( '--lazy', action='store_true', help='decode only the 245/907/945 fields, via the record directory' )
+    extract_parser.add_argument( '--resume', action='store_true', help='carry on from the last checkpoint (serial paths only)' )
+    extract_parser.add_argument( '--pipeline', action='store_true', help='run the asyncio reader/parser/writer pipeline; --workers sizes its process pool' )
+    extract_parser.add_argument( '--select', nargs='?', const='', default=None, metavar='SPEC',
+        help='extract the columns of a field-selector spec, e.g. `bib_id=907a[0:9];items=945y*`; with no SPEC, uses settings.EXTRACT_SELECTORS' )
+    extract_parser.add_argument( '--cached', action='store_true', help='serve rows from the persistent extraction cache, (re)building only what changed' )
+    extract_parser.add_argument( '--filter', default=None, metavar='SPEC', help='extract only records passing a RecordFilter spec; defaults to settings.RECORD_FILTER' )
+    profile_parser = subparsers.add_parser( 'profile', help='tag frequency, items per record, size histogram & encodings, from leaders & directories' )
+    profile_parser.add_argument( '--input', default=None, help='marc file; defaults to settings.INPUT_FILEPATH' )
+    profile_parser.add_argument( '--report', default=None, help='defaults to `<input>.profile.json`' )
+    profile_parser.add_argument( '--workers', type=int, default=0, help='worker processes; 0 uses every cpu' )
+    sqlite_parser = subparsers.add_parser( 'load_sqlite', help='bulk-load bib/title/item rows into normalized sqlite tables' )
+    sqlite_parser.add_argument( 'db_filepath' )
+    sqlite_parser.add_argument( '--input', default=None, help='marc file; defaults to settings.INPUT_FILEPATH' )
+    duplicates_parser = subparsers.add_parser( 'duplicates', help='report bib_ids & item_ids carried by more than one record, in bounded memory' )
+    duplicates_parser.add_argument( 'inputs', nargs='*', help='marc files; defaults to settings.INPUT_FILEPATH' )
+    duplicates_parser.add_argument( '--output-dir', required=True, help='where duplicates.jsonl is written' )
+    duplicates_parser.add_argument( '--memory-mb', type=int, default=None, help='defaults to settings.DUPLICATE_MEMORY_MB' )
+    batch_parser = subparsers.add_parser( 'batch', help='run count/validate/extract over every marc file of a directory or glob, largest first' )
+    batch_parser.add_argument( 'source', help='a directory (its *.mrc, *.mrc.gz, *.mrc.bz2 & *.mrc.xz files) or a quoted glob' )
+    batch_parser.add_argument( '--job', choices=BATCH_JOBS, default='count' )
+    batch_parser.add_argument( '--workers', type=int, default=0, help='worker processes; 0 uses every cpu' )
+    batch_parser.add_argument( '--output-dir', default=None, help='for quarantine files, reports & sinks; defaults to `<source-dir>/batch_output`' )
+    return parser
+
+
+def main():
+    """ Dispatches a sub-command and prints its result as json. """
+    args = build_arg_parser().parse_args()
+    if args.command == 'count_fast':
+        result = count_records_fast( args.input )
+    elif args.command == 'build_index':
+        index = RecordOffsetIndex( args.input ); index.build()
+        result = { 'index_filepath': index.index_filepath, 'count': len(index) }
+    elif args.command == 'break_up_indexed':
+        result = { 'records_written': break_up_record_indexed(args.start_record, args.end_record) }
+    elif args.command == 'validate':
+        result = validate_records( args.input, args.quarantine, args.report, check_utf8=not args.skip_utf8 )
+        result.pop( 'problems' )
+    elif args.command == 'diff':
+        result = diff_snapshots( args.old_filepath, args.new_filepath, args.output_dir, args.changed_marc, args.partitions )
+    elif args.command == 'build_id_index':
+        index = RecordIdIndex( args.input ); index.build()
+        result = { 'db_filepath': index.db_filepath }
+    elif args.command == 'lookup':
+        raws = RecordIdIndex( args.input ).ensure().lookup( args.record_id )
+        if args.raw:
+            sys.stdout.buffer.write( b''.join(raws) )
+            return
+        result = [ pymarc.Record(raw, force_utf8=True, utf8_handling='ignore').as_dict() for raw in raws ]
+    elif args.command == 'split':
+        result = split_records( args.output_dir, args.mode, args.records_per_file, args.bytes_per_file, args.partitions, args.input, args.filter )
+    elif args.command == 'extract':
+        extractor = Extractor( filter_spec=args.filter )
+        if args.cached:
+            extractor.extract_info_cached()
+        elif args.select is not None:
+            extractor.extract_info_selected( args.select or None, resume=args.resume )
+        elif args.pipeline:
+            extractor.extract_info_async( args.workers or None, lazy=args.lazy )
+        elif args.workers != 1:
+            extractor.extract_info_parallel( args.workers or None, lazy=args.lazy )
+        elif args.lazy:
+            extractor.extract_info_lazy( resume=args.resume )
+        else:
+            extractor.extract_info( resume=args.resume )
+        result = { 'count': extractor.count, 'stages': extractor.timer.summary() }
+        if extractor.record_filter:
+            result['filtered_out'] = extractor.filtered_out
+        if extractor.error_counts:
+            result['skipped'] = extractor.error_counts
+        if extractor.cache_status:
+            result['cache'] = extractor.cache_status
+        if extractor.decoder:
+            result['decode'] = extractor.decoder.summary()
+    elif args.command == 'profile':
+        result = profile_records( args.input, args.report, args.workers or None )
+    elif args.command == 'load_sqlite':
+        result = load_sqlite( args.db_filepath, args.input )
+    elif args.command == 'duplicates':
+        result = find_duplicates( args.inputs or [settings.INPUT_FILEPATH], args.output_dir, args.memory_mb )
+    elif args.command == 'batch':
+        result = process_batch( args.source, args.job, args.workers or None, args.output_dir )
+    else:
+        build_arg_parser().print_help()
+        return
+    print( json.dumps(result, indent=2) )
+
+
+if __name__ == '__main__':
+    main()
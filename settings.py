@@ -32,3 +32,53 @@ LOG_CONFIG_DCT = {
 
 INPUT_FILEPATH = os.environ['PYMARC_EXP__INPUT_MARC_FILEPATH']
 OUTPUT_FILEPATH = os.environ['PYMARC_EXP__OUTPUT_MARC_FILEPATH']
+
+## optional structured output for Extractor rows; when SINK_FILEPATH is empty, rows are logged as before
+SINK_FILEPATH = os.environ.get( 'PYMARC_EXP__SINK_FILEPATH', '' )
+SINK_FORMAT = os.environ.get( 'PYMARC_EXP__SINK_FORMAT', 'jsonl' )  # 'jsonl', 'csv', 'columnar', or 'sqlite'
+SINK_FLUSH_SIZE = int( os.environ.get('PYMARC_EXP__SINK_FLUSH_SIZE', '1000') )
+
+## periodic checkpoints for resumable Extractor runs; CHECKPOINT_FILEPATH defaults to `<INPUT_FILEPATH>.checkpoint.json`
+CHECKPOINT_FILEPATH = os.environ.get( 'PYMARC_EXP__CHECKPOINT_FILEPATH', '' )
+CHECKPOINT_EVERY = int( os.environ.get('PYMARC_EXP__CHECKPOINT_EVERY', '100000') )  # records
+
+## seconds between Extractor progress-lines (rate, percent of bytes consumed, eta)
+PROGRESS_INTERVAL_SECONDS = float( os.environ.get('PYMARC_EXP__PROGRESS_INTERVAL_SECONDS', '10') )
+
+## read-buffer for plain & compressed (.gz/.bz2/.xz) marc input
+READ_BUFFER_SIZE = int( os.environ.get('PYMARC_EXP__READ_BUFFER_SIZE', str(8*1024*1024)) )
+
+## record decoding: 'ignore' is the original force_utf8/utf8_handling='ignore' behaviour, which silently drops bad bytes;
+## 'fallback' takes a strict utf-8 fast path and re-decodes only failing fields -- via MARC-8 when leader/09 isn't 'a', else just their invalid bytes via DECODE_FALLBACK
+DECODE_MODE = os.environ.get( 'PYMARC_EXP__DECODE_MODE', 'ignore' )
+DECODE_FALLBACK = os.environ.get( 'PYMARC_EXP__DECODE_FALLBACK', 'latin-1' )  # 'latin-1' keeps every byte; 'replace' marks bad bytes with U+FFFD
+
+## parallel extract: largest shard (MB) -- so a worker's row-list stays bounded on big files -- and shards in flight per worker
+PARALLEL_SHARD_MB = int( os.environ.get('PYMARC_EXP__PARALLEL_SHARD_MB', '64') )
+PARALLEL_SHARDS_IN_FLIGHT = int( os.environ.get('PYMARC_EXP__PARALLEL_SHARDS_IN_FLIGHT', '2') )
+
+## asyncio pipeline: records per batch, and batches allowed in each bounded queue (so memory stays flat)
+PIPELINE_BATCH_SIZE = int( os.environ.get('PYMARC_EXP__PIPELINE_BATCH_SIZE', '1000') )
+PIPELINE_QUEUE_SIZE = int( os.environ.get('PYMARC_EXP__PIPELINE_QUEUE_SIZE', '8') )
+
+## field-selectors for `extract --select`: `name=TAG` + optional `@` (leading subfield only) + subfield-codes + optional `[start:end]` slice
+##   + optional mode (`^` first field, `*` every match; default last match) + optional `?` (None, not 'not_available', when missing)
+## the default gives the same title/bib_id/item_id as extract_info()
+EXTRACT_SELECTORS = os.environ.get( 'PYMARC_EXP__EXTRACT_SELECTORS', 'title=245ab^?;bib_id=907@a[0:9];item_id=945y' )
+
+## memory cap (MB) for duplicate-detection: half goes to its two bloom-filters, half to each on-disk partition confirmed in memory
+DUPLICATE_MEMORY_MB = int( os.environ.get('PYMARC_EXP__DUPLICATE_MEMORY_MB', '256') )
+
+## sqlite sink: rows per transaction (the sink's executemany batches are SINK_FLUSH_SIZE rows)
+SQLITE_TRANSACTION_ROWS = int( os.environ.get('PYMARC_EXP__SQLITE_TRANSACTION_ROWS', '100000') )
+SQLITE_SELECTORS = os.environ.get( 'PYMARC_EXP__SQLITE_SELECTORS', 'title=245ab^?;bib_id=907@a[0:9];item_ids=945y*' )  # used by `load_sqlite`
+
+## optional RecordFilter spec for Extractor runs, e.g. `945l=loc3;856` -- records failing it are dropped from their raw bytes, before any parse
+RECORD_FILTER = os.environ.get( 'PYMARC_EXP__RECORD_FILTER', '' )
+
+## persistent extraction cache for `extract --cached`: one columnar entry per input file, least-recently-used entries evicted past EXTRACT_CACHE_MAX_MB
+EXTRACT_CACHE_DIR = os.environ.get( 'PYMARC_EXP__EXTRACT_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'pymarc_experimentation') )
+EXTRACT_CACHE_MAX_MB = int( os.environ.get('PYMARC_EXP__EXTRACT_CACHE_MAX_MB', '2048') )
+
+## count_fast lists at most this many malformed records (all are still counted)
+MALFORMED_REPORT_LIMIT = int( os.environ.get('PYMARC_EXP__MALFORMED_REPORT_LIMIT', '1000') )